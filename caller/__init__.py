@@ -18,6 +18,7 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+from .client import Call, Client, get, get_many, paginate  # noqa: F401
 from .utils import call  # noqa: F401
 from .version import get_version
 
@@ -0,0 +1,62 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from urllib.parse import quote_plus, urlencode
+
+from . import conf
+
+
+class Batch:
+    """
+    The batch variant of a view.
+
+    The batch view is called once with the key of every item as a repeated `param`
+    querystring parameter, and it must return a json object which maps every key
+    to the payload the single view would return for it.
+    The key is the `arg` url argument of the single view, by position (int) or by name (str).
+    """
+    def __init__(self, *, view, arg=0, param="id"):
+        self.view = view
+        self.arg = arg
+        self.param = param
+
+    def get_key(self, args, kwargs):
+        if isinstance(self.arg, int):
+            return str(args[self.arg])
+        return str(kwargs[self.arg])
+
+    def get_params(self, keys, params):
+        qs = urlencode([(self.param, key) for key in keys], quote_via=quote_plus)
+        return "&".join(bit for bit in (qs, params) if bit)
+
+    def split(self, data, keys):
+        return {key: data.get(key) for key in keys}
+
+
+def get_batch(view):
+    """
+    Return the Batch configured in CALLER_BATCH_VIEWS for view, if any
+    """
+    options = conf.get("BATCH_VIEWS").get(view)
+    if options is None:
+        return None
+    if isinstance(options, str):
+        options = {"view": options}
+    return Batch(**options)
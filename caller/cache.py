@@ -0,0 +1,148 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.translation import get_language
+
+from . import conf
+from .frozen import freeze
+
+
+def get_timeout(view):
+    """
+    Return the cache timeout configured in CALLER_CACHE_VIEWS for view
+    """
+    return conf.get_for_view("CACHE_VIEWS", view)
+
+
+def make_key(request, url, qs):
+    """
+    Return the cache key of a call made by request: payloads with absolute urls
+    depend on the scheme and the host of the request, and on CALLER_CACHE_VARY environ keys
+    """
+    vary = [request.scheme]
+    vary.extend(str(request.environ.get(name, "")) for name in conf.get("CACHE_VARY"))
+    key = "{}?{}#{}#{}".format(url, qs or "", get_language() or "", "#".join(vary))
+    return "caller:{}".format(hashlib.md5(key.encode("utf-8")).hexdigest())
+
+
+def get(key, timeout=None):
+    """
+    Return the cached result for key, from the in process cache (see MemoryCache)
+    if CALLER_MEMORY_CACHE_SIZE is set, then from the CALLER_CACHE cache
+    (and keep it in the in process cache until it expires there)
+    """
+    in_memory = conf.get("MEMORY_CACHE_SIZE")
+    if in_memory:
+        value = memory.get(key)
+        if value is not None:
+            return value
+    entry = caches[conf.get("CACHE")].get(key)
+    if entry is None:
+        return None
+    # (expiry time, value), see set()
+    expires, value = entry if isinstance(entry, tuple) else (None, entry)
+    remaining = timeout if expires is None else expires - time.time()
+    if remaining is not None and remaining <= 0:
+        return None
+    if in_memory and remaining:
+        value = memory.set(key, value, remaining)
+    return value
+
+
+def set(key, value, timeout):
+    """
+    Store value and return it (frozen, if it's stored in the in process cache too).
+
+    The value is stored with its expiry time, so the in process cache
+    keeps it only for the time left.
+    """
+    caches[conf.get("CACHE")].set(key, (time.time() + timeout, value), timeout)
+    if conf.get("MEMORY_CACHE_SIZE"):
+        value = memory.set(key, value, timeout)
+    return value
+
+
+class MemoryCache:
+    """
+    In process cache of frozen (read only) results, see caller.frozen.
+
+    Every render gets the same object, without unpickling a copy.
+    The approximate size of the results is bounded by CALLER_MEMORY_CACHE_SIZE (bytes),
+    the least recently used ones are evicted first.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key => (value, size, expires)
+        self._entries = OrderedDict()
+        self.size = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] <= time.monotonic():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, timeout):
+        """
+        Freeze value, store it and return it
+        """
+        value, size = freeze(value)
+        max_size = conf.get("MEMORY_CACHE_SIZE")
+        if size > max_size:
+            return value
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (value, size, time.monotonic() + timeout)
+            self.size += size
+            while self.size > max_size:
+                self._pop(next(iter(self._entries)))
+        return value
+
+    def _pop(self, key):
+        value, size, expires = self._entries.pop(key)
+        self.size -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+memory = MemoryCache()
+
+
+@receiver(setting_changed)
+def reset(*, setting, **kwargs):
+    if setting in ("CALLER_MEMORY_CACHE_SIZE", "CALLER_CACHE"):
+        memory.clear()
@@ -0,0 +1,220 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import functools
+from collections import OrderedDict
+from urllib.parse import unquote_plus
+
+from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
+
+from . import executor
+from .batch import get_batch
+from .fields import add_fields_param, parse_fields, project
+from .pagination import Paginated
+from .utils import call, encode_params, logger
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+# no default value: raise the exception of a failed call
+MISSING = object()
+
+
+class Call:
+    """
+    A call to a view by name, with its url args (or kwargs), querystring params
+    and the fields to ask (see caller.fields)
+    """
+    def __init__(self, view, *, args=None, kwargs=None, params=None, timeout=None, fields=None):
+        self.view = view
+        self.args = args
+        self.kwargs = kwargs
+        self.params = encode_params(params)
+        self.timeout = timeout
+        self.fields = parse_fields(fields)
+
+    def __repr__(self):
+        return "<Call: {}>".format(self.view)
+
+    @property
+    def url(self):
+        return unquote_plus(reverse(self.view, args=self.args or None, kwargs=self.kwargs or None))
+
+
+def get_result(func, return_exceptions):
+    try:
+        return func()
+    except Exception as e:
+        if return_exceptions:
+            return e
+        raise
+
+
+def get_or_default(func, view, default):
+    """
+    Return func() or, if it fails (or times out), default
+    """
+    try:
+        return func()
+    except Exception as exc:
+        logger.warning("call to %s failed, using the default: %r", view, exc)
+        return default
+
+
+def apply_options(func, *, view, lazy=False, wait=None, default=MISSING):
+    """
+    Run func(), a call to view, as the template options ask.
+
+    With lazy (or wait) func runs in the process pool: with lazy a lazy object
+    which waits for its result when first used is returned, wait is the maximum
+    time (in seconds) to wait for it. If func fails or times out default is returned.
+    """
+    if lazy or wait is not None:
+        future = executor.submit(func, view=view)
+        func = functools.partial(future.result, float(wait) if wait is not None else None)
+    if default is not MISSING:
+        func = functools.partial(get_or_default, func, view, default)
+    return SimpleLazyObject(func) if lazy else func()
+
+
+class Client:
+    """
+    Call views by name from python code, like {% call %} does in templates
+
+        client = Client(request)
+        posts = client.get("api:post-list", params={"amount": 2})
+        post, other = client.get_many([
+            Call("api:post-detail", args=[1, "post-1"]),
+            Call("api:post-detail", args=[2, "post-2"]),
+        ])
+    """
+    def __init__(self, request):
+        # calling a rest framework view it assumes that it's the original HttpRequest
+        self.request = getattr(request, "_request", request)
+
+    def call(self, call, *, with_status=False):
+        return self.get(
+            call.view, args=call.args, kwargs=call.kwargs, params=call.params, timeout=call.timeout,
+            fields=call.fields, with_status=with_status,
+        )
+
+    def get(self, view, *, args=None, kwargs=None, params=None, timeout=None, method="GET", fields=None, with_status=False):  # noqa: E501
+        """
+        Call view and return its decoded json payload, with only fields if given (see caller.fields).
+        With with_status (payload, response status code) is returned.
+        """
+        url = Call(view, args=args, kwargs=kwargs).url
+        return call(
+            request=self.request, url=url, qs=params, view=view, timeout=timeout, method=method, fields=fields,
+            with_status=with_status,
+        )
+
+    def paginate(self, view, *, args=None, kwargs=None, params=None, timeout=None, limit=None, fields=None):
+        """
+        Call view, a paginated list, and return its items as a caller.pagination.Paginated,
+        which fetches the pages while they are used, up to limit items (or CALLER_PAGINATE_LIMIT)
+        """
+        url = Call(view, args=args, kwargs=kwargs).url
+        fetch = functools.partial(self.get_page, view, timeout, fields)
+        return Paginated(fetch, url, encode_params(params), limit=limit)
+
+    def get_page(self, view, timeout, fields, url, qs):
+        return call(request=self.request, url=url, qs=qs, view=view, timeout=timeout, fields=fields)
+
+    def get_many(self, calls, *, return_exceptions=False, return_status=False):
+        """
+        Run calls and return their payloads, in order, or (payload, response status code)
+        if return_status is true.
+
+        Calls to a view with a batch variant (see CALLER_BATCH_VIEWS) are coalesced
+        into a single call, the others run concurrently in the process pool (see caller.executor).
+        If return_exceptions is true the exception raised by a call is returned
+        as its result, otherwise it is raised.
+        """
+        calls = list(calls)
+        # (func, args, view, [(index, key)]): the result of func(*args) is the payload
+        # of calls[index], or its key item for batch calls
+        tasks = []
+        groups = OrderedDict()
+        for index, item in enumerate(calls):
+            batch = get_batch(item.view)
+            if batch is None:
+                tasks.append((functools.partial(self.call, with_status=True), (item,), item.view, [(index, None)]))
+            else:
+                fields = tuple(item.fields) if item.fields else None
+                group = groups.setdefault((batch.view, item.params, item.timeout, fields), (batch, OrderedDict()))
+                group[1].setdefault(batch.get_key(item.args, item.kwargs), []).append(index)
+        for (view, params, timeout, fields), (batch, keys) in groups.items():
+            positions = [(index, key) for key, indexes in keys.items() for index in indexes]
+            tasks.append((self.get_batch, (batch, list(keys), params, timeout, fields), view, positions))
+
+        if len(tasks) > 1:
+            futures = [executor.submit(func, *args, view=view) for func, args, view, positions in tasks]
+            done = [get_result(future.result, return_exceptions) for future in futures]
+        else:
+            done = [
+                get_result(functools.partial(func, *args), return_exceptions)
+                for func, args, view, positions in tasks
+            ]
+
+        results = [None] * len(calls)
+        for (func, args, view, positions), result in zip(tasks, done):
+            for index, key in positions:
+                if isinstance(result, Exception):
+                    results[index] = result
+                    continue
+                data, status = result
+                data = data if key is None else data[key]
+                results[index] = (data, status) if return_status else data
+        return results
+
+    def get_batch(self, batch, keys, params, timeout, fields=None):
+        # the items of a batch call get the status of the batch response; the fields
+        # are passed to the batch view, and every item is projected on them
+        params = add_fields_param(batch.get_params(keys, params), fields)
+        data, status = self.get(batch.view, params=params, timeout=timeout, with_status=True)
+        data = batch.split(data, keys)
+        if fields:
+            data = {key: project(value, fields) for key, value in data.items()}
+        return data, status
+
+
+def get(view, *, request, args=None, kwargs=None, params=None, timeout=None, method="GET", fields=None):
+    """
+    Call view and return its decoded json payload, see Client.get()
+    """
+    return Client(request).get(
+        view, args=args, kwargs=kwargs, params=params, timeout=timeout, method=method, fields=fields,
+    )
+
+
+def paginate(view, *, request, args=None, kwargs=None, params=None, timeout=None, limit=None, fields=None):
+    """
+    Call view, a paginated list, and return its items fetched while they are used, see Client.paginate()
+    """
+    return Client(request).paginate(
+        view, args=args, kwargs=kwargs, params=params, timeout=timeout, limit=limit, fields=fields,
+    )
+
+
+def get_many(calls, *, request, return_exceptions=False, return_status=False):
+    """
+    Run calls concurrently and return their payloads, in order, see Client.get_many()
+    """
+    return Client(request).get_many(calls, return_exceptions=return_exceptions, return_status=return_status)
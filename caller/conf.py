@@ -0,0 +1,120 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from django.conf import settings
+
+DEFAULTS = {
+    # cache alias used to store call results
+    "CACHE": "default",
+    # view name (or namespace) => cache timeout, in seconds
+    "CACHE_VIEWS": {},
+    # environ keys which make the cached payloads of the same call different (with the url scheme)
+    "CACHE_VARY": ["HTTP_HOST"],
+    # view name => batch variant, to coalesce calls inside {% for %} loops
+    "BATCH_VIEWS": {},
+    # number of threads of the process pool which runs concurrent calls, 0 to run them in the calling thread
+    "MAX_WORKERS": 4,
+    # view name (or namespace) => maximum number of concurrent calls
+    "VIEW_LIMITS": {},
+    # run the calls inside {% for %} loops without a batch variant concurrently
+    "PREFETCH_LOOPS": False,
+    # view names (or namespaces) BatchView can call
+    "BATCH_ALLOWED": [],
+    # maximum number of calls of a BatchView request
+    "BATCH_MAX_CALLS": 20,
+    # middleware for calls, None for settings.MIDDLEWARE
+    "MIDDLEWARE": None,
+    # view name (or namespace) => middleware for its calls
+    "MIDDLEWARE_PROFILES": {},
+    # share the attributes of the original request with its calls, instead of loading them again
+    "SHARE_REQUEST": False,
+    # request attributes shared with calls
+    "SHARED_ATTRIBUTES": ["session", "user"],
+    # middleware which set the shared attributes, not run for calls when sharing
+    "SHARED_MIDDLEWARE": [
+        "django.contrib.sessions.middleware.SessionMiddleware",
+        "django.contrib.auth.middleware.AuthenticationMiddleware",
+    ],
+    # keep the payloads of the calls of every request for {% caller_hydration %}, see caller.stats.enable_hydration()
+    "HYDRATION": False,
+    # calls to run with `manage.py caller_warm`
+    "WARM": [],
+    # count the database queries of every call
+    "QUERIES": False,
+    # maximum number of queries of a call, or view name (or namespace) => maximum number of queries
+    "QUERY_BUDGET": None,
+    # what to do when a call exceeds its query budget: "log" or "raise"
+    "QUERY_BUDGET_ACTION": "log",
+    # check the literal view names of {% call %} tags against the URLconf when templates are compiled
+    "VALIDATE_VIEWS": False,
+    # maximum size of a call response in bytes, or view name (or namespace) => maximum size
+    "MAX_RESPONSE_SIZE": None,
+    # maximum size in bytes of all the call responses read while serving a request
+    "MAX_REQUEST_SIZE": None,
+    # call django rest framework views directly and use the data of their responses, globally or
+    # by view name (or namespace)
+    "DRF_FAST_PATH": False,
+    # maximum size (approximate, in bytes) of the in process cache of frozen results, 0 to disable it
+    "MEMORY_CACHE_SIZE": 0,
+    # maximum number of items fetched by paginated calls
+    "PAGINATE_LIMIT": 1000,
+    # keys of the payloads of paginated views: the items (the first key with a list value),
+    # the link to the next page, the total number of items, and the page querystring parameter
+    # used when the payload has no next link
+    "PAGINATION": {"items": ["results", "data", "items"], "next": "next", "count": "count", "page": "page"},
+    # "record" the results of calls in CALLER_SNAPSHOT_PATH, or "replay" them without running the views
+    "SNAPSHOT_MODE": None,
+    # the snapshot file, see caller.snapshot
+    "SNAPSHOT_PATH": None,
+    # querystring parameter with the comma separated fields asked by a call, see caller.fields
+    "FIELDS_PARAM": "fields",
+    # keys of the payloads which wrap the objects projected on the asked fields
+    "FIELDS_ENVELOPE": ["results", "data", "items"],
+    # tracer of the calls (a caller.tracing.Tracer or its dotted path), None to disable tracing
+    "TRACER": None,
+    # share the response of a call with the identical calls running at the same time in other threads,
+    # globally or by view name (or namespace)
+    "SINGLE_FLIGHT": False,
+    # environ keys which make identical calls different
+    "SINGLE_FLIGHT_VARY": ["HTTP_HOST", "HTTP_COOKIE", "HTTP_AUTHORIZATION"],
+}
+
+
+def get(name):
+    """
+    Return the CALLER_<name> setting, or its default value
+    """
+    return getattr(settings, "CALLER_{}".format(name), DEFAULTS[name])
+
+
+def get_for_view(name, view):
+    """
+    Return the CALLER_<name> setting for view.
+
+    If the setting is a dict it is looked up by the full view name first and then by its namespaces.
+    """
+    value = get(name)
+    if not isinstance(value, dict):
+        return value
+    while view:
+        if view in value:
+            return value[view]
+        view = view.rpartition(":")[0]
+    return None
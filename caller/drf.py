@@ -0,0 +1,116 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+import json
+
+from django.urls import resolve
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.renderers import JSONRenderer
+from rest_framework.views import APIView
+
+from .exceptions import ResponseTooLarge
+from .utils import PARENT_KEY, CallRequest, get_environ, get_max_size
+
+# dispatch() result for views which are not rest framework views
+NOT_DRF = object()
+
+
+class FirstRendererNegotiation(BaseContentNegotiation):
+    """
+    Use the first parser and renderer of the view, without looking at the request headers
+    """
+    def select_parser(self, request, parsers):
+        return parsers[0] if parsers else None
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+# view function => fast path view function (None if it's not a rest framework view)
+_views = {}
+
+
+def get_view(func):
+    """
+    Return the view function of func for internal calls: without throttles and content negotiation
+    """
+    try:
+        return _views[func]
+    except KeyError:
+        pass
+    cls = getattr(func, "cls", None)
+    view = None
+    if isinstance(cls, type) and issubclass(cls, APIView):
+        initkwargs = dict(func.initkwargs, throttle_classes=(), content_negotiation_class=FirstRendererNegotiation)
+        actions = getattr(func, "actions", None)
+        view = cls.as_view(actions, **initkwargs) if actions is not None else cls.as_view(**initkwargs)
+    _views[func] = view
+    return view
+
+
+def dispatch(request, url, qs, *, view=None, span=None, stats=None):
+    """
+    Call a rest framework view (APIView or ViewSet) directly, skipping the middleware,
+    throttles, content negotiation and rendering, and return the data of its response.
+    The call is authenticated as the user of request, if it has one.
+
+    When a response size limit applies to the call (see caller.utils.get_max_size())
+    the data is rendered as json to measure it, otherwise its size is not known.
+
+    Return NOT_DRF if url is not served by a rest framework view.
+    """
+    match = resolve(url)
+    func = get_view(match.func)
+    if func is None:
+        return NOT_DRF
+
+    environ = get_environ(request, url, qs, span=span)
+    # share the session and the user with the call
+    environ[PARENT_KEY] = request
+    call_request = CallRequest(environ)
+    user = getattr(request, "user", None)
+    if user is not None:
+        call_request._force_auth_user = user
+        call_request._force_auth_token = None
+
+    max_size = get_max_size(request, view)
+    response = func(call_request, *match.args, **match.kwargs)
+    if span is not None:
+        span.set_attribute("http.status_code", response.status_code)
+    if stats is not None:
+        stats.status = response.status_code
+    if hasattr(response, "data"):
+        data = response.data
+        if max_size is not None:
+            check_size(url, len(JSONRenderer().render(data)), max_size, span, stats)
+        return data
+    # a plain django response
+    check_size(url, len(response.content), max_size, span, stats)
+    return json.loads(response.content.decode(response.charset))
+
+
+def check_size(url, size, max_size, span, stats):
+    if stats is not None:
+        stats.bytes = size
+    if span is not None:
+        span.set_attribute("http.response_content_length", size)
+    if max_size is not None and size > max_size:
+        raise ResponseTooLarge("The response of {} is larger than {} bytes".format(url, max_size))
@@ -0,0 +1,57 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+class CallerError(Exception):
+    """
+    Base class of caller errors
+    """
+
+
+class QueryBudgetExceeded(CallerError):
+    """
+    A call run more database queries than its CALLER_QUERY_BUDGET
+    """
+
+
+class ResponseTooLarge(CallerError):
+    """
+    The response of a call is larger than CALLER_MAX_RESPONSE_SIZE,
+    or than what is left of CALLER_MAX_REQUEST_SIZE
+    """
+
+
+class SnapshotMissing(CallerError):
+    """
+    A call replayed with CALLER_SNAPSHOT_MODE = "replay" is not recorded in the snapshot
+    """
+
+
+class FrozenResultError(CallerError, TypeError):
+    """
+    A shared (frozen) call result was changed, see caller.frozen.thaw()
+    """
+
+
+class CallInLoopWarning(RuntimeWarning):
+    """
+    A {% call %} is rendered inside a {% for %} loop without a batch variant,
+    so it runs one request per iteration
+    """
@@ -0,0 +1,191 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import atexit
+import functools
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.core.signals import setting_changed
+from django.db import connections
+from django.dispatch import receiver
+from django.urls import get_script_prefix, get_urlconf, set_script_prefix, set_urlconf
+from django.utils import timezone, translation
+
+from . import conf
+
+_lock = threading.Lock()
+_executor = None
+_max_workers = None
+_limiters = {}
+_local = threading.local()
+
+
+def get_max_workers():
+    return conf.get("MAX_WORKERS") if _max_workers is None else _max_workers
+
+
+def configure(max_workers=None):
+    """
+    Set the number of workers of the process pool (None for CALLER_MAX_WORKERS)
+    """
+    global _max_workers
+    _max_workers = max_workers
+    shutdown(wait=False)
+
+
+def get_executor():
+    """
+    Return the process wide ThreadPoolExecutor
+    """
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=get_max_workers())
+    return _executor
+
+
+@atexit.register
+def shutdown(wait=True):
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+class Limiter:
+    """
+    Run at most limit tasks at the same time in the process pool: the others
+    wait in a queue, without taking a worker thread from the other views
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self.running = 0
+        self.queue = deque()
+        self.lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        future = Future()
+        with self.lock:
+            if self.running >= self.limit:
+                self.queue.append((future, fn, args))
+                return future
+            self.running += 1
+        self.start(future, fn, args)
+        return future
+
+    def start(self, future, fn, args):
+        if not future.set_running_or_notify_cancel():
+            self.next()
+            return
+        try:
+            task = get_executor().submit(fn, *args)
+        except Exception as e:
+            future.set_exception(e)
+            self.next()
+            return
+        task.add_done_callback(functools.partial(self.finish, future))
+
+    def finish(self, future, task):
+        # start the next task first, so that a waiter of future can submit again without waiting
+        self.next()
+        if task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
+
+    def next(self):
+        with self.lock:
+            if not self.queue:
+                self.running -= 1
+                return
+            future, fn, args = self.queue.popleft()
+        self.start(future, fn, args)
+
+
+def get_limiter(view):
+    """
+    Return the Limiter of the concurrent calls to view, as set
+    by CALLER_VIEW_LIMITS for the view name or its namespace, if any
+    """
+    limits = conf.get("VIEW_LIMITS")
+    name = view
+    while name and name not in limits:
+        name = name.rpartition(":")[0]
+    if not name:
+        return None
+    try:
+        return _limiters[name]
+    except KeyError:
+        with _lock:
+            return _limiters.setdefault(name, Limiter(limits[name]))
+
+
+@receiver(setting_changed)
+def reset(*, setting, **kwargs):
+    if setting == "CALLER_MAX_WORKERS":
+        shutdown(wait=False)
+    elif setting == "CALLER_VIEW_LIMITS":
+        with _lock:
+            _limiters.clear()
+
+
+def run(state, func, args, kwargs):
+    """
+    Run func in a worker thread with the state of the submitting thread
+    """
+    language, urlconf, script_prefix, tz = state
+    set_urlconf(urlconf)
+    set_script_prefix(script_prefix)
+    _local.worker = True
+    try:
+        with translation.override(language), timezone.override(tz):
+            return func(*args, **kwargs)
+    finally:
+        _local.worker = False
+        set_urlconf(None)
+        connections.close_all()
+
+
+def submit(func, *args, view=None, **kwargs):
+    """
+    Run func(*args, **kwargs) in the process pool and return its Future.
+
+    The worker thread gets the active language, timezone, urlconf and script prefix.
+    Concurrent calls to view are limited by CALLER_VIEW_LIMITS: the calls over
+    the limit wait for a free slot before they take a worker thread.
+    With CALLER_MAX_WORKERS = 0, or from a worker thread (which could deadlock
+    waiting for the pool), func runs in the current thread, without limits.
+    """
+    if get_max_workers() < 1 or getattr(_local, "worker", False):
+        future = Future()
+        try:
+            future.set_result(func(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    state = (translation.get_language(), get_urlconf(), get_script_prefix(), timezone.get_current_timezone())
+    limiter = get_limiter(view) if view else None
+    if limiter is not None:
+        return limiter.submit(run, state, func, args, kwargs)
+    return get_executor().submit(run, state, func, args, kwargs)
@@ -0,0 +1,89 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Sparse field selection: a call can ask only some fields of the objects of the payload.
+
+The fields are passed to the view as a comma separated CALLER_FIELDS_PARAM querystring
+parameter (`?fields=id,title`): a cooperating view reads them with get_fields(request)
+to load and serialize less, and the caller projects the payload of any view on them.
+"""
+
+from urllib.parse import parse_qsl, quote_plus, urlencode
+
+from . import conf
+
+
+def parse_fields(fields):
+    """
+    Return fields (a comma separated string or a list of names) as a list, or None for all the fields
+    """
+    if fields is None:
+        return None
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    fields = [str(field).strip() for field in fields]
+    return [field for field in fields if field] or None
+
+
+def get_fields(request):
+    """
+    Return the fields asked by request, or None if it asks all the fields
+    """
+    return parse_fields(request.GET.get(conf.get("FIELDS_PARAM")))
+
+
+def add_fields_param(qs, fields):
+    """
+    Return the querystring qs with the fields param, replacing the one it has
+    (the next link of a page has it already)
+    """
+    if not fields:
+        return qs
+    param = conf.get("FIELDS_PARAM")
+    params = [(key, value) for key, value in parse_qsl(qs, keep_blank_values=True) if key != param]
+    return urlencode(params + [(param, ",".join(fields))], quote_via=quote_plus)
+
+
+def project(data, fields):
+    """
+    Return data with only fields: the fields of the objects of a list,
+    of the list (or object) in an envelope key (see CALLER_FIELDS_ENVELOPE),
+    or of the object itself
+    """
+    if isinstance(data, list):
+        return [project_object(item, fields) for item in data]
+    if isinstance(data, dict):
+        for key in conf.get("FIELDS_ENVELOPE"):
+            value = data.get(key)
+            if isinstance(value, (list, dict)):
+                projected = dict(data)
+                if isinstance(value, list):
+                    projected[key] = [project_object(item, fields) for item in value]
+                else:
+                    projected[key] = project_object(value, fields)
+                return projected
+    return project_object(data, fields)
+
+
+def project_object(value, fields):
+    if not isinstance(value, dict):
+        return value
+    return {key: value[key] for key in fields if key in value}
@@ -0,0 +1,118 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+import sys
+
+from .exceptions import FrozenResultError
+
+
+def readonly(name):
+    def method(self, *args, **kwargs):
+        raise FrozenResultError(
+            "call results are shared and can't be changed ({}.{}), "
+            "use caller.frozen.thaw() to get a copy".format(type(self).__name__, name)
+        )
+    method.__name__ = name
+    return method
+
+
+class FrozenDict(dict):
+    """
+    A read only dict
+    """
+    __setitem__ = readonly("__setitem__")
+    __delitem__ = readonly("__delitem__")
+    __ior__ = readonly("__ior__")
+    clear = readonly("clear")
+    pop = readonly("pop")
+    popitem = readonly("popitem")
+    setdefault = readonly("setdefault")
+    update = readonly("update")
+
+    def __reduce__(self):
+        return type(self), (dict(self),)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class FrozenList(list):
+    """
+    A read only list
+    """
+    __setitem__ = readonly("__setitem__")
+    __delitem__ = readonly("__delitem__")
+    __iadd__ = readonly("__iadd__")
+    __imul__ = readonly("__imul__")
+    append = readonly("append")
+    clear = readonly("clear")
+    extend = readonly("extend")
+    insert = readonly("insert")
+    pop = readonly("pop")
+    remove = readonly("remove")
+    reverse = readonly("reverse")
+    sort = readonly("sort")
+
+    def __reduce__(self):
+        return type(self), (list(self),)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+def freeze(value):
+    """
+    Return a decoded json payload as read only FrozenDict and FrozenList,
+    and its approximate size in memory
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        items = []
+        for key, item in value.items():
+            item, item_size = freeze(item)
+            items.append((key, item))
+            size += sys.getsizeof(key) + item_size
+        return FrozenDict(items), size
+    if isinstance(value, list):
+        items = []
+        for item in value:
+            item, item_size = freeze(item)
+            items.append(item)
+            size += item_size
+        return FrozenList(items), size
+    return value, size
+
+
+def thaw(value):
+    """
+    Return a mutable copy of a frozen payload
+    """
+    if isinstance(value, dict):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [thaw(item) for item in value]
+    return value
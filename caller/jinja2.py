@@ -0,0 +1,152 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""
+Jinja2 support: add the extension to the jinja2 environment
+
+    TEMPLATES = [{
+        "BACKEND": "django.template.backends.jinja2.Jinja2",
+        "OPTIONS": {"extensions": ["caller.jinja2.CallExtension"]},
+    }]
+
+and call views with the `callview` tag, which has the grammar and the options
+of the {% call %} django tag, with comma separated arguments
+
+    {% callview 'api:post-detail', 1, 'post-1' with full=1 as post cache=60 %}
+
+or with the `call_view()` and `call_many()` global functions
+
+    {% set posts = call_view('api:post-list', params={'amount': 2}, lazy=True) %}
+    {% set details = call_many(calls) %}
+"""
+
+import functools
+
+import jinja2
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+from .client import MISSING, SAFE_METHODS, Client, apply_options
+
+# jinja2 < 3.0
+pass_context = getattr(jinja2, "pass_context", None) or jinja2.contextfunction
+
+# name=value options and flags after `as varname`
+OPTIONS = ("cache", "timeout", "default", "method", "paginate", "fields")
+FLAGS = ("lazy", "paginate")
+
+
+def get_client(context):
+    request = context.get("request")
+    if request is None:
+        raise RuntimeError("call_view() needs the request in the template context")
+    return Client(request)
+
+
+@pass_context
+def call_view(context, view, *args, params=None, cache=None, lazy=False, timeout=None, default=MISSING, method="GET", paginate=False, fields=None, **kwargs):  # noqa: E501
+    """
+    Call view with url args (or kwargs) and querystring params and return its
+    decoded json payload, see the options of the {% call %} tag
+    """
+    method = str(method).upper()
+    if method not in SAFE_METHODS:
+        raise ValueError("call_view() method must be one of {}".format(", ".join(SAFE_METHODS)))
+    client = get_client(context)
+    if paginate:
+        func = functools.partial(
+            client.paginate, view, args=args or None, kwargs=kwargs or None, params=params, timeout=cache,
+            limit=None if paginate is True else paginate, fields=fields,
+        )
+    else:
+        func = functools.partial(
+            client.get, view, args=args or None, kwargs=kwargs or None, params=params, timeout=cache, method=method,
+            fields=fields,
+        )
+    return apply_options(func, view=view, lazy=lazy, wait=timeout, default=default)
+
+
+@pass_context
+def call_many(context, calls, *, return_exceptions=False):
+    """
+    Run calls (caller.Call instances) and return their payloads, in order.
+    Calls with a batch variant are coalesced, see caller.Client.get_many()
+    """
+    return get_client(context).get_many(calls, return_exceptions=return_exceptions)
+
+
+class CallExtension(Extension):
+    """
+    The `callview` tag and the `call_view()`/`call_many()` global functions
+    """
+    tags = {"callview"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.globals.setdefault("call_view", call_view)
+        environment.globals.setdefault("call_many", call_many)
+
+    def parse(self, parser):
+        stream = parser.stream
+        lineno = next(stream).lineno
+        view = parser.parse_expression()
+        stream.skip_if("comma")
+
+        args, kwargs, params = [], [], []
+        is_param = False
+        while stream.current.type != "block_end" and not stream.current.test("name:as"):
+            if stream.skip_if("name:with"):
+                is_param = True
+                continue
+            if stream.current.type == "name" and stream.look().type == "assign":
+                key = next(stream).value
+                next(stream)
+                value = parser.parse_expression()
+                (params if is_param else kwargs).append(nodes.Pair(nodes.Const(key), value, lineno=lineno))
+            elif is_param:
+                parser.fail("'callview' params must be key=value", stream.current.lineno)
+            else:
+                args.append(parser.parse_expression())
+            stream.skip_if("comma")
+        if args and kwargs:
+            parser.fail("Cannot mix args and kwargs in 'callview' tag", lineno)
+
+        stream.expect("name:as")
+        target = parser.parse_assign_target(name_only=True)
+
+        options = []
+        while stream.current.type != "block_end":
+            token = stream.expect("name")
+            if token.value in FLAGS and stream.current.type != "assign":
+                options.append(nodes.Keyword(token.value, nodes.Const(True), lineno=token.lineno))
+            elif token.value in OPTIONS:
+                stream.expect("assign")
+                options.append(nodes.Keyword(token.value, parser.parse_expression(), lineno=token.lineno))
+            else:
+                parser.fail("Unknown option '{}' in 'callview' tag".format(token.value), token.lineno)
+            stream.skip_if("comma")
+
+        options.append(nodes.Keyword("params", nodes.List(
+            [nodes.Tuple([pair.key, pair.value], "load") for pair in params],
+        )))
+        options.extend(nodes.Keyword(pair.key.value, pair.value) for pair in kwargs)
+        call = nodes.Call(nodes.Name("call_view", "load"), [view] + args, options, None, None)
+        return nodes.Assign(target, call, lineno=lineno)
@@ -0,0 +1,88 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import json
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from ... import scanner
+
+
+class Command(BaseCommand):
+    help = "Report the {% call %} usage of every template, ranked by expected cost"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--timings", metavar="FILE",
+            help="Json file with the timing (in ms) of every view, as saved by caller_warm --save-timings.",
+        )
+        parser.add_argument(
+            "--loop-factor", type=int, default=10,
+            help="Expected iterations of a {% for %} loop (default: 10).",
+        )
+
+    def get_timing(self, node, timings):
+        if not timings:
+            return 1
+        if scanner.is_literal(node.view):
+            view = scanner.resolve_literal(node.view)
+            if view in timings:
+                return timings[view]
+        # unknown view, guess the average
+        return sum(timings.values()) / len(timings)
+
+    def get_report(self, name, template, timings, loop_factor):
+        calls = list(scanner.get_tree_calls(template))
+        if not calls:
+            return None
+        signatures = Counter(scanner.get_signature(node) for node, loops, source in calls)
+        cost, lines = 0, []
+        for node, loops, source in calls:
+            signature = scanner.get_signature(node)
+            cost += self.get_timing(node, timings) * loop_factor ** len(loops)
+            notes = ["literal" if scanner.get_literal_call(node) is not None else "dynamic"]
+            if loops:
+                notes.append("in loop (N+1)")
+            if signatures[signature] > 1:
+                notes.append("duplicate")
+            if source != name:
+                notes.append("from {}".format(source))
+            lines.append("  {}  [{}]".format(signature, ", ".join(notes)))
+        return cost, len(calls), name, lines
+
+    def handle(self, *args, **options):
+        timings = None
+        if options["timings"]:
+            with open(options["timings"]) as fp:
+                timings = json.load(fp)
+
+        reports = []
+        for name, template in scanner.get_templates():
+            report = self.get_report(name, template, timings, options["loop_factor"])
+            if report is not None:
+                reports.append(report)
+        reports.sort(key=lambda report: (-report[0], -report[1], report[2]))
+
+        unit = "ms" if timings else " calls"
+        for cost, count, name, lines in reports:
+            self.stdout.write("{} (cost: {:.1f}{}, {} calls)".format(name, cost, unit, count))
+            for line in lines:
+                self.stdout.write(line)
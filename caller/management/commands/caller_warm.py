@@ -0,0 +1,163 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import json
+import time
+from urllib.parse import unquote_plus
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.urls import reverse
+from django.utils import translation
+
+from ... import cache, conf, executor, scanner
+from ...fields import parse_fields
+from ...utils import call, encode_params
+
+
+class Command(BaseCommand):
+    help = "Fill the call cache running the {% call %} endpoints found in templates and in CALLER_WARM"
+    leave_locale_alone = True
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=None,
+            help="Number of concurrent calls (default: CALLER_MAX_WORKERS).",
+        )
+        parser.add_argument(
+            "--host", action="append", dest="hosts", default=None,
+            help=(
+                "Host (or scheme://host) of the calls request, can be repeated "
+                "(default: every ALLOWED_HOSTS entry without wildcards, or localhost)."
+            ),
+        )
+        parser.add_argument(
+            "--no-templates", action="store_false", dest="templates",
+            help="Do not scan templates for {% call %} with literal arguments.",
+        )
+        parser.add_argument(
+            "--save-timings", dest="timings", metavar="FILE",
+            help="Save the timing (in ms) of every view into FILE as json.",
+        )
+
+    def get_hosts(self, hosts):
+        """
+        Return the (scheme, host) to warm: cached payloads depend on them
+        """
+        if not hosts:
+            hosts = [host.lstrip(".") for host in settings.ALLOWED_HOSTS if "*" not in host] or ["localhost"]
+        result = []
+        for host in hosts:
+            scheme, sep, name = host.rpartition("://")
+            result.append((scheme or "http", name))
+        return result
+
+    def get_request(self, scheme, host):
+        return RequestFactory(HTTP_HOST=host).get("/", secure=scheme == "https")
+
+    def get_calls(self, templates):
+        entries = []
+        for entry in conf.get("WARM"):
+            if isinstance(entry, str):
+                entry = {"view": entry}
+            entries.append(entry)
+        if templates:
+            for name, template in scanner.get_templates():
+                for node, loops in scanner.get_calls(template):
+                    entry = scanner.get_literal_call(node)
+                    if entry is not None:
+                        options = entry.pop("options")
+                        if options.get("cache") is not None:
+                            entry["timeout"] = options["cache"]
+                        entry["method"] = options.get("method", "GET")
+                        entry["fields"] = options.get("fields")
+                        entries.append(entry)
+
+        calls, seen = [], set()
+        for entry in entries:
+            entry = {
+                "view": entry["view"],
+                "args": list(entry.get("args") or []),
+                "kwargs": dict(entry.get("kwargs") or {}),
+                "params": encode_params(entry.get("params")),
+                "timeout": entry.get("timeout", cache.get_timeout(entry["view"])),
+                "method": str(entry.get("method", "GET")).upper(),
+                "fields": parse_fields(entry.get("fields")),
+            }
+            key = json.dumps(entry, sort_keys=True, default=str)
+            if key not in seen:
+                seen.add(key)
+                calls.append(entry)
+        return calls
+
+    def warm(self, request, entry):
+        with translation.override(settings.LANGUAGE_CODE):
+            url = unquote_plus(reverse(entry["view"], args=entry["args"] or None, kwargs=entry["kwargs"] or None))
+            start = time.perf_counter()
+            call(
+                request=request,
+                url=url,
+                qs=entry["params"],
+                view=entry["view"],
+                timeout=entry["timeout"],
+                fields=entry["fields"],
+                refresh=True,
+            )
+            return url, (time.perf_counter() - start) * 1000
+
+    def warm_all(self, request, templates):
+        timings, futures = {}, []
+        for entry in self.get_calls(templates):
+            if entry["method"] != "GET":
+                self.stdout.write("{} skipped ({} calls are not cached)".format(entry["view"], entry["method"]))
+                continue
+            if not entry["timeout"]:
+                self.stdout.write("{} skipped (no cache timeout)".format(entry["view"]))
+                continue
+            futures.append((entry, executor.submit(self.warm, request, entry, view=entry["view"])))
+        for entry, future in futures:
+            try:
+                url, elapsed = future.result()
+            except Exception as e:
+                self.stderr.write("{} failed: {!r}".format(entry["view"], e))
+                continue
+            timings.setdefault(entry["view"], []).append(elapsed)
+            self.stdout.write("{} {} {:.1f}ms ({}://{})".format(
+                entry["view"], url, elapsed, request.scheme, request.META["HTTP_HOST"],
+            ))
+        return timings
+
+    def handle(self, *args, **options):
+        if options["workers"] is not None:
+            executor.configure(max_workers=options["workers"])
+        timings = {}
+        try:
+            for scheme, host in self.get_hosts(options["hosts"]):
+                request = self.get_request(scheme, host)
+                for view, values in self.warm_all(request, options["templates"]).items():
+                    timings.setdefault(view, []).extend(values)
+        finally:
+            if options["workers"] is not None:
+                executor.configure()
+
+        if options["timings"]:
+            with open(options["timings"], "w") as fp:
+                json.dump({view: sum(values) / len(values) for view, values in timings.items()}, fp, indent=2)
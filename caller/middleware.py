@@ -0,0 +1,49 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import logging
+
+from .stats import DEPTH_KEY, ENVIRON_KEY
+
+logger = logging.getLogger("caller")
+
+
+class StatsMiddleware:
+    """
+    Log a summary of the calls made while serving a request, slowest first
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        stats = request.environ.get(ENVIRON_KEY)
+        # calls share the stats of the original request, which will log them
+        if stats is not None and stats.calls and not request.environ.get(DEPTH_KEY):
+            lines = ["{} {}: {} calls in {:.1f}ms, {} queries in {:.1f}ms, {} bytes".format(
+                request.method, request.get_full_path(),
+                len(stats.calls), stats.duration * 1000,
+                stats.queries, stats.query_time * 1000,
+                stats.bytes,
+            )]
+            for call in sorted(stats.calls, key=lambda call: -(call.duration or 0)):
+                lines.append("{}{}".format("  " * (call.depth + 1), call))
+            logger.info("\n".join(lines))
+        return response
@@ -0,0 +1,139 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from urllib.parse import parse_qsl, unquote, urlencode, urlsplit
+
+from . import conf
+
+
+def get_options():
+    """
+    Return CALLER_PAGINATION, with the default value of the missing keys
+    """
+    return dict(conf.DEFAULTS["PAGINATION"], **conf.get("PAGINATION"))
+
+
+def get_items(data, keys):
+    """
+    Return the items of a page: the page itself if it's a list, or its first list value among keys
+    """
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        for key in keys:
+            if isinstance(data.get(key), list):
+                return data[key]
+    return []
+
+
+def set_page(qs, param, page):
+    """
+    Return the querystring qs with the param parameter set to page
+    """
+    params = [(key, value) for key, value in parse_qsl(qs, keep_blank_values=True) if key != param]
+    params.append((param, str(page)))
+    return urlencode(params)
+
+
+class Paginated:
+    """
+    The items of a paginated view, fetched a page at a time while they are used.
+
+    fetch(url, qs) returns the decoded payload of a page. The next page is the
+    `next` link of the payload if it has one (stopping when it's empty), otherwise
+    the same url with the `page` querystring parameter incremented (stopping at the
+    first empty page). No more pages are fetched after limit items.
+
+    Iterating (or indexing) the object fetches only the pages it needs: a loop which
+    stops early, or a slice, doesn't fetch the following pages. len() is the `count`
+    of the payload if it has one, otherwise it fetches all the pages.
+    """
+    def __init__(self, fetch, url, qs, *, limit=None):
+        self.options = get_options()
+        self.fetch = fetch
+        self.limit = conf.get("PAGINATE_LIMIT") if limit is None else int(limit)
+        self.count = None
+        self.pages = 0
+        self.items = []
+        # (url, qs) of the next page to fetch, None after the last one
+        self.next = (url, qs or "")
+        self.page = 1
+
+    def __repr__(self):
+        return "<Paginated: {} items, {} pages>".format(len(self.items), self.pages)
+
+    def fetch_page(self):
+        url, qs = self.next
+        data = self.fetch(url, qs)
+        self.pages += 1
+        items = get_items(data, self.options["items"])
+        self.items.extend(items[:max(self.limit - len(self.items), 0)])
+
+        next_key, count_key = self.options["next"], self.options["count"]
+        if isinstance(data, dict) and isinstance(data.get(count_key), int):
+            self.count = data[count_key]
+        if len(self.items) >= self.limit:
+            self.next = None
+        elif isinstance(data, dict) and next_key in data:
+            link = urlsplit(data[next_key]) if data[next_key] else None
+            self.next = (unquote(link.path) or url, link.query) if link else None
+        elif items:
+            self.page += 1
+            self.next = (url, set_page(qs, self.options["page"], self.page))
+        else:
+            self.next = None
+
+    def fill(self, index=None):
+        """
+        Fetch pages until the item at index (or the last one) is available
+        """
+        while self.next is not None and (index is None or len(self.items) <= index):
+            self.fetch_page()
+
+    def __iter__(self):
+        index = 0
+        while True:
+            self.fill(index)
+            if index >= len(self.items):
+                return
+            yield self.items[index]
+            index += 1
+
+    def __len__(self):
+        if self.pages == 0:
+            self.fill(0)
+        if self.count is not None:
+            return min(self.count, self.limit)
+        self.fill()
+        return len(self.items)
+
+    def __bool__(self):
+        self.fill(0)
+        return bool(self.items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.stop is None or index.stop < 0 or (index.start or 0) < 0:
+                self.fill()
+            else:
+                self.fill(index.stop - 1)
+        else:
+            self.fill(index if index >= 0 else None)
+        return self.items[index]
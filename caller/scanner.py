@@ -0,0 +1,216 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import os
+
+from django.template import Context, Variable, engines
+from django.template.backends.django import DjangoTemplates
+from django.template.base import FilterExpression
+from django.template.exceptions import TemplateDoesNotExist, TemplateSyntaxError
+from django.utils.functional import Promise
+
+
+# {% call %} options which change the cached result of a call
+LITERAL_OPTIONS = ("cache", "method", "fields")
+
+
+def get_loader_templates(loader):
+    """
+    Yield the template names a template loader knows about
+    """
+    if hasattr(loader, "loaders"):
+        # cached loader
+        for child in loader.loaders:
+            yield from get_loader_templates(child)
+    elif hasattr(loader, "templates_dict"):
+        # locmem loader
+        yield from loader.templates_dict
+    elif hasattr(loader, "get_dirs"):
+        # filesystem and app_directories loaders
+        for directory in loader.get_dirs():
+            for root, dirs, files in os.walk(str(directory)):
+                for filename in files:
+                    yield os.path.relpath(os.path.join(root, filename), str(directory)).replace(os.sep, "/")
+
+
+def get_templates():
+    """
+    Yield (name, template) for every template of the django template engines
+    """
+    for backend in engines.all():
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        engine = backend.engine
+        seen = set()
+        for loader in engine.template_loaders:
+            for name in get_loader_templates(loader):
+                if name in seen:
+                    continue
+                seen.add(name)
+                try:
+                    yield name, engine.get_template(name)
+                except (TemplateDoesNotExist, TemplateSyntaxError, UnicodeDecodeError):
+                    continue
+
+
+def walk(nodelist, loops=()):
+    """
+    Yield (node, loops) for every node in nodelist, where loops are the
+    enclosing {% for %} nodes
+    """
+    from django.template.defaulttags import ForNode
+
+    for node in nodelist:
+        yield node, loops
+        inner = loops + (node,) if isinstance(node, ForNode) else loops
+        for attr in node.child_nodelists:
+            children = getattr(node, attr, None)
+            if children:
+                yield from walk(children, inner)
+
+
+def get_calls(template):
+    """
+    Yield (node, loops) for every {% call %} in template
+    """
+    from .templatetags.caller_tags import CallNode
+
+    for node, loops in walk(template.nodelist):
+        if isinstance(node, CallNode):
+            yield node, loops
+
+
+def get_tree_calls(template, loops=(), blocks=None, stack=()):
+    """
+    Yield (node, loops, template name) for every {% call %} rendered by template,
+    following {% extends %} and {% include %} with a literal template name
+    """
+    from django.template.defaulttags import ForNode
+    from django.template.loader_tags import BlockNode, ExtendsNode, IncludeNode
+
+    from .templatetags.caller_tags import CallNode
+
+    if template.origin.template_name in stack:
+        return
+    stack += (template.origin.template_name,)
+    blocks = blocks or {}
+
+    def get_template(expression):
+        if not isinstance(expression, FilterExpression) or not is_literal(expression):
+            return None
+        try:
+            return template.engine.get_template(resolve_literal(expression))
+        except (TemplateDoesNotExist, TemplateSyntaxError):
+            return None
+
+    def visit(nodelist, loops, name):
+        for node in nodelist:
+            if isinstance(node, CallNode):
+                yield node, loops, name
+            elif isinstance(node, BlockNode) and node.name in blocks:
+                block, block_name = blocks[node.name]
+                yield from visit(block.nodelist, loops, block_name)
+                continue
+            elif isinstance(node, IncludeNode):
+                included = get_template(node.template)
+                if included is not None:
+                    yield from get_tree_calls(included, loops, None, stack)
+            inner = loops + (node,) if isinstance(node, ForNode) else loops
+            for attr in node.child_nodelists:
+                children = getattr(node, attr, None)
+                if children:
+                    yield from visit(children, inner, name)
+
+    nodelist = template.nodelist
+    if nodelist and isinstance(nodelist[0], ExtendsNode):
+        extends = nodelist[0]
+        parent = get_template(extends.parent_name)
+        if parent is not None:
+            # blocks of the most derived template win
+            name = template.origin.template_name
+            inherited = {block_name: (block, name) for block_name, block in extends.blocks.items()}
+            inherited.update(blocks)
+            yield from get_tree_calls(parent, loops, inherited, stack)
+            return
+    yield from visit(nodelist, loops, template.origin.template_name)
+
+
+def is_literal(expression):
+    """
+    Check if a template expression (a Variable or a FilterExpression) does not
+    depend on the template context
+    """
+    if isinstance(expression, FilterExpression):
+        if any(lookup for func, args in expression.filters for lookup, arg in args):
+            return False
+        expression = expression.var
+    # _("...") strings are translated in the language active on render
+    if isinstance(expression, Promise):
+        return False
+    if isinstance(expression, Variable):
+        return expression.literal is not None and not expression.translate
+    return True
+
+
+def resolve_literal(expression):
+    return expression.resolve(Context())
+
+
+def get_source(expression):
+    """
+    Return the template source of a Variable or a FilterExpression
+    """
+    return expression.var if isinstance(expression, Variable) else expression.token
+
+
+def get_signature(node):
+    """
+    Return the {% call %} arguments as written in the template
+    """
+    bits = [get_source(node.view)]
+    bits.extend(get_source(arg) for arg in node.args or [])
+    bits.extend("{}={}".format(key, get_source(value)) for key, value in (node.kwargs or {}).items())
+    if node.params:
+        bits.append("with")
+        bits.extend("{}={}".format(key, get_source(value)) for key, value in node.params)
+    return " ".join(bits)
+
+
+def get_literal_call(node):
+    """
+    Return the view, args, kwargs, params (a list of (key, value)) and the options
+    which change the cached result (cache, method and fields) of a {% call %} node
+    which has only literal arguments, None otherwise
+    """
+    options = {name: value for name, value in node.options.items() if name in LITERAL_OPTIONS}
+    expressions = [node.view]
+    expressions.extend(node.args or [])
+    expressions.extend((node.kwargs or {}).values())
+    expressions.extend(value for key, value in node.params)
+    expressions.extend(options.values())
+    if not all(is_literal(expression) for expression in expressions):
+        return None
+    return {
+        "view": resolve_literal(node.view),
+        "args": [resolve_literal(arg) for arg in node.args or []],
+        "kwargs": {key: resolve_literal(value) for key, value in (node.kwargs or {}).items()},
+        "params": [(key, resolve_literal(value)) for key, value in node.params],
+        "options": {name: resolve_literal(value) for name, value in options.items()},
+    }
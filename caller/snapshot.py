@@ -0,0 +1,159 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Record the results of calls to a snapshot file, and replay them without running the views.
+
+    CALLER_SNAPSHOT_MODE = "record"  # or "replay"
+    CALLER_SNAPSHOT_PATH = "/path/to/snapshot.jsonl"
+
+The file has a json line for every recorded call, with its method, url, querystring,
+response status and decoded payload. Recording a call again replaces its line, so
+the file is rewritten only when a result changes.
+"""
+
+import copy
+import json
+import os
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from . import conf
+from .exceptions import SnapshotMissing
+
+MODES = ("record", "replay")
+
+
+class Snapshot:
+    """
+    The recorded calls of a snapshot file
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self._entries = None
+
+    def __repr__(self):
+        return "<Snapshot: {}>".format(self.path)
+
+    @staticmethod
+    def make_key(method, url, qs):
+        return method, url, qs or ""
+
+    @property
+    def entries(self):
+        if self._entries is None:
+            with self.lock:
+                if self._entries is None:
+                    self._entries = self.load()
+        return self._entries
+
+    def load(self):
+        entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in filter(None, map(str.strip, f)):
+                    entry = json.loads(line)
+                    entries[self.make_key(entry["method"], entry["url"], entry["qs"])] = entry
+        return entries
+
+    def get(self, method, url, qs):
+        """
+        Return the recorded entry of a call, a dict with its method, url, qs, status and data.
+        Every replay gets its own copy, which can be changed
+        """
+        try:
+            return copy.deepcopy(self.entries[self.make_key(method, url, qs)])
+        except KeyError:
+            raise SnapshotMissing("{} {}{} is not recorded in {}".format(
+                method, url, "?" + qs if qs else "", self.path,
+            )) from None
+
+    def record(self, method, url, qs, *, status, data):
+        entry = {"method": method, "url": url, "qs": qs or "", "status": status, "data": data}
+        entry = json.loads(self.dumps(entry))
+        key = self.make_key(method, url, qs)
+        entries = self.entries
+        with self.lock:
+            if entries.get(key) == entry:
+                return
+            entries[key] = entry
+            self.save(entries)
+
+    @staticmethod
+    def dumps(entry):
+        return json.dumps(entry, cls=DjangoJSONEncoder, separators=(",", ":"), sort_keys=True)
+
+    def save(self, entries):
+        # write a new file and replace the old one, a failed write leaves it as it was
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(tmp, "w", encoding="utf-8") as f:
+            for entry in entries.values():
+                f.write(self.dumps(entry) + "\n")
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        with self.lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self._entries = {}
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_mode():
+    """
+    Return CALLER_SNAPSHOT_MODE ("record", "replay" or None)
+    """
+    mode = conf.get("SNAPSHOT_MODE")
+    if mode is not None and mode not in MODES:
+        raise ImproperlyConfigured("CALLER_SNAPSHOT_MODE must be one of {} or None".format(", ".join(MODES)))
+    return mode
+
+
+def get_snapshot():
+    """
+    Return the Snapshot of CALLER_SNAPSHOT_PATH
+    """
+    global _snapshot
+    path = conf.get("SNAPSHOT_PATH")
+    if not path:
+        raise ImproperlyConfigured("CALLER_SNAPSHOT_MODE needs CALLER_SNAPSHOT_PATH")
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.path == path:
+        return snapshot
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot.path != path:
+            _snapshot = Snapshot(path)
+        return _snapshot
+
+
+@receiver(setting_changed)
+def reset(*, setting, **kwargs):
+    global _snapshot
+    if setting in ("CALLER_SNAPSHOT_MODE", "CALLER_SNAPSHOT_PATH"):
+        _snapshot = None
@@ -0,0 +1,34 @@
+/*
+ * Answer fetch() GET requests with the payloads rendered by {% caller_hydration %},
+ * instead of requesting them again to the server.
+ * Every payload answers only the first matching request.
+ *
+ * Load it after {% caller_hydration %} and before the scripts which fetch data.
+ */
+(function() {
+  "use strict";
+
+  var el = document.getElementById("caller-hydration");
+  if (!el || !window.fetch || !window.Response || !window.URL) {
+    return;
+  }
+  var payloads = JSON.parse(el.textContent || el.innerText);
+  var fetch = window.fetch;
+
+  window.fetch = function(input, init) {
+    var method = (init && init.method) || (typeof input === "string" ? "GET" : input.method) || "GET";
+    if (method.toUpperCase() === "GET") {
+      var url = new URL(typeof input === "string" ? input : input.url, window.location.href);
+      var key = url.pathname + url.search;
+      if (url.origin === window.location.origin && Object.prototype.hasOwnProperty.call(payloads, key)) {
+        var body = JSON.stringify(payloads[key]);
+        delete payloads[key];
+        return Promise.resolve(new Response(body, {
+          status: 200,
+          headers: {"Content-Type": "application/json"}
+        }));
+      }
+    }
+    return fetch.apply(this, arguments);
+  };
+})();
@@ -0,0 +1,155 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import time
+from collections import OrderedDict
+
+from django.utils.encoding import iri_to_uri
+
+from . import conf
+
+ENVIRON_KEY = "caller.stats"
+DEPTH_KEY = "caller.depth"
+HYDRATION_KEY = "caller.hydration"
+
+
+class CallStats:
+    """
+    Statistics of a single call
+    """
+    def __init__(self, *, view, url, qs, depth):
+        self.view = view
+        self.url = url
+        self.qs = qs
+        # 0 for calls made by the original request, 1 for calls made by a call, ...
+        self.depth = depth
+        self.cached = False
+        # the decoded payload of top level calls, once the call is done, if hydration is enabled
+        self.data = None
+        self.queries = None
+        self.query_time = None
+        self.duration = None
+        # size of the response, in bytes
+        self.bytes = None
+        # status code of the response
+        self.status = None
+
+    def __repr__(self):
+        return "<CallStats: {}>".format(self)
+
+    def __str__(self):
+        bits = ["{}?{}".format(self.url, self.qs) if self.qs else self.url]
+        if self.duration is not None:
+            bits.append("{:.1f}ms".format(self.duration * 1000))
+        if self.bytes is not None:
+            bits.append("{} bytes".format(self.bytes))
+        if self.cached:
+            bits.append("cached")
+        if self.queries is not None:
+            bits.append("{} queries in {:.1f}ms".format(self.queries, self.query_time * 1000))
+        return " ".join(bits)
+
+
+class RequestStats:
+    """
+    Statistics of every call made while serving a request, nested calls included
+    """
+    def __init__(self):
+        self.calls = []
+
+    def add(self, **kwargs):
+        stats = CallStats(**kwargs)
+        self.calls.append(stats)
+        return stats
+
+    @property
+    def toplevel(self):
+        return [stats for stats in self.calls if stats.depth == 0]
+
+    @property
+    def duration(self):
+        return sum(stats.duration or 0 for stats in self.toplevel)
+
+    @property
+    def queries(self):
+        return sum(stats.queries or 0 for stats in self.toplevel)
+
+    @property
+    def query_time(self):
+        return sum(stats.query_time or 0 for stats in self.toplevel)
+
+    @property
+    def bytes(self):
+        # the responses of nested calls are read too
+        return sum(stats.bytes or 0 for stats in self.calls)
+
+
+def enable_hydration(request):
+    """
+    Keep the payloads of the calls made by request, for {% caller_hydration %}
+    (CALLER_HYDRATION enables it for every request)
+    """
+    request = getattr(request, "_request", request)
+    request.environ[HYDRATION_KEY] = True
+
+
+def is_hydration_enabled(request):
+    return bool(conf.get("HYDRATION") or request.environ.get(HYDRATION_KEY))
+
+
+def get_hydration(request):
+    """
+    Return the payloads of the successful calls made by request (nested calls excluded),
+    keyed by url and querystring, as a client would request them
+    """
+    stats = request.environ.get(ENVIRON_KEY)
+    hydration = OrderedDict()
+    for call in stats.toplevel if stats is not None else []:
+        if call.data is not None:
+            url = iri_to_uri(call.url)
+            hydration["{}?{}".format(url, call.qs) if call.qs else url] = call.data
+    return hydration
+
+
+def get_stats(request):
+    """
+    Return the RequestStats of request.
+
+    They are stored in the request environ, which is copied into the environ of
+    every call, so nested calls are collected by the original request too.
+    """
+    return request.environ.setdefault(ENVIRON_KEY, RequestStats())
+
+
+class QueryCounter:
+    """
+    Database execute wrapper which counts queries and their time
+    """
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.time += time.perf_counter() - start
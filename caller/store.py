@@ -0,0 +1,213 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+
+SCHEMA = """
+BEGIN IMMEDIATE;
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE TABLE IF NOT EXISTS meta (id INTEGER PRIMARY KEY CHECK (id = 0), size INTEGER NOT NULL, count INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta VALUES (0, 0, 0);
+COMMIT;
+"""
+
+
+def create_database(location):
+    """
+    Create the database file, readable and writable only by the current user, and check
+    that an existing one is owned by the current user: its pickled values are trusted
+    """
+    flags = os.O_RDWR | os.O_CREAT | getattr(os, "O_NOFOLLOW", 0)
+    fd = os.open(location, flags, 0o600)
+    try:
+        stat = os.fstat(fd)
+        if hasattr(os, "getuid") and stat.st_uid != os.getuid():
+            raise ImproperlyConfigured("{} is not owned by the current user".format(location))
+        if stat.st_mode & 0o077:
+            os.fchmod(fd, 0o600)
+    finally:
+        os.close(fd)
+
+
+class SharedMemoryCache(BaseCache):
+    """
+    A cache shared by the processes of a host, without a server: a sqlite database
+    in a memory backed filesystem, at LOCATION (required, a path in /dev/shm for example).
+    The file is created readable and writable only by the current user.
+
+    Its size is bounded by the MAX_SIZE option (bytes of the pickled values, default 64MB)
+    and the MAX_ENTRIES option, the least recently used entries are evicted first.
+
+        CACHES = {
+            "caller": {
+                "BACKEND": "caller.store.SharedMemoryCache",
+                "LOCATION": "/dev/shm/caller.sqlite3",
+                "OPTIONS": {"MAX_SIZE": 128 * 1024 * 1024, "MAX_ENTRIES": 10000},
+            },
+        }
+    """
+    # seconds between the updates of the access time of an entry
+    touch_interval = 1.0
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        if not location:
+            # a default path would be shared by every project of the host
+            raise ImproperlyConfigured("SharedMemoryCache needs a LOCATION, the path of its database file")
+        self.location = location
+        self.max_size = int(options.get("MAX_SIZE", 64 * 1024 * 1024))
+        self._local = threading.local()
+
+    def get_connection(self):
+        # sqlite connections are per thread, and can't be used after a fork
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            create_database(self.location)
+            connection = sqlite3.connect(self.location, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = OFF")
+            connection.executescript(SCHEMA)
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    @contextmanager
+    def transaction(self):
+        connection = self.get_connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self.get_connection()
+        row = connection.execute("SELECT value, expires, accessed FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return default
+        value, expires, accessed = row
+        now = time.time()
+        if expires is not None and expires <= now:
+            return default
+        if now - accessed > self.touch_interval:
+            connection.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+        return pickle.loads(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._set(key, value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._set(key, value, timeout, add=True)
+
+    def _set(self, key, value, timeout, *, add=False):
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        with self.transaction() as connection:
+            row = connection.execute("SELECT size, expires FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                if add and (row[1] is None or row[1] > now):
+                    return False
+                self._delete(connection, key, row[0])
+            if len(value) > self.max_size:
+                return False
+            connection.execute(
+                "INSERT INTO entries (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), expires, now),
+            )
+            connection.execute("UPDATE meta SET size = size + ?, count = count + 1", (len(value),))
+            self._cull(connection, now)
+        return True
+
+    def _delete(self, connection, key, size):
+        connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+        connection.execute("UPDATE meta SET size = size - ?, count = count - 1", (size,))
+
+    def _cull(self, connection, now):
+        size, count = connection.execute("SELECT size, count FROM meta").fetchone()
+        if size <= self.max_size and count <= self._max_entries:
+            return
+        connection.execute("DELETE FROM entries WHERE expires <= ?", (now,))
+        size, count = connection.execute("SELECT total(size), count(*) FROM entries").fetchone()
+        evicted = []
+        for key, entry_size in connection.execute("SELECT key, size FROM entries ORDER BY accessed"):
+            if size <= self.max_size and count <= self._max_entries:
+                break
+            evicted.append((key,))
+            size, count = size - entry_size, count - 1
+        connection.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        connection.execute("UPDATE meta SET size = ?, count = ?", (size, count))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self.transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE entries SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                (self.get_backend_timeout(timeout), key, time.time()),
+            )
+        return cursor.rowcount > 0
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = self.get_connection().execute(
+            "SELECT 1 FROM entries WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self.transaction() as connection:
+            row = connection.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return False
+            self._delete(connection, key, row[0])
+        return True
+
+    def clear(self):
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM entries")
+            connection.execute("UPDATE meta SET size = 0, count = 0")
@@ -0,0 +1,90 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+import itertools
+import threading
+from concurrent.futures import as_completed
+
+from django.http import StreamingHttpResponse
+from django.template import loader
+from django.utils.html import format_html
+
+from . import executor
+from .utils import logger
+
+# template context variable of the Deferred collector of the response being streamed
+DEFERRED_KEY = "caller_deferred"
+
+FILL = (
+    '<template id="{0}-content">{1}</template>'
+    '<script>(function(t, p) {{ p.replaceWith(t.content); t.remove(); }})'
+    '(document.getElementById("{0}-content"), document.getElementById("{0}"));</script>'
+)
+
+
+class Deferred:
+    """
+    The {% deferred %} blocks of a streamed response, rendered in the process pool
+    """
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.futures = {}
+
+    def add(self, render):
+        """
+        Run render() in the process pool and return the id of the placeholder it replaces
+        """
+        with self._lock:
+            element_id = "caller-deferred-{}".format(next(self._ids))
+            self.futures[executor.submit(render)] = element_id
+        return element_id
+
+    def fill(self, future):
+        element_id = self.futures[future]
+        try:
+            content = future.result()
+        except Exception:
+            logger.exception("rendering %s failed", element_id)
+            content = ""
+        return format_html(FILL, element_id, content)
+
+    def __iter__(self):
+        """
+        Yield the chunks which fill the placeholders, as their blocks are rendered
+        """
+        for future in as_completed(list(self.futures)):
+            yield self.fill(future)
+
+
+def render_to_stream(request, template_name, context=None, using=None, **kwargs):
+    """
+    Return a StreamingHttpResponse which sends the page with a placeholder for every
+    {% deferred %} block right away, then a chunk which fills each placeholder
+    as soon as its block (and its calls) is rendered.
+
+    kwargs are passed to StreamingHttpResponse (content_type, status).
+    """
+    deferred = Deferred()
+    context = dict(context or {})
+    context[DEFERRED_KEY] = deferred
+    shell = loader.get_template(template_name, using=using).render(context, request)
+    return StreamingHttpResponse(itertools.chain([shell], deferred), **kwargs)
@@ -18,45 +18,187 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import functools
 import json
-from urllib.parse import unquote_plus
+import re
+import warnings
+from collections import OrderedDict
 
-from caller.utils import call
+from caller import conf
+from caller.batch import get_batch
+from caller.client import MISSING, SAFE_METHODS, Call, Client, apply_options
+from caller.exceptions import CallInLoopWarning
+from caller.fields import parse_fields
+from caller.scanner import is_literal, resolve_literal
+from caller.stats import get_hydration
+from caller.streaming import DEFERRED_KEY
+from caller.utils import encode_params
 from django import template
+from django.conf import settings
 from django.template import TemplateSyntaxError
-from django.urls import reverse
+from django.template.base import kwarg_re
+from django.urls import get_resolver, get_urlconf
+from django.utils.html import format_html
 from django.utils.translation import gettext as _
 
 register = template.Library()
 
 
+# name=value options and flags after `as varname`
+OPTIONS = ("cache", "timeout", "default", "method", "paginate", "fields")
+FLAGS = ("lazy", "paginate")
+
+
 class CallNode(template.Node):
-    def __init__(self, *, view, args, kwargs, params, varname):
+    def __init__(self, *, view, args, kwargs, params, varname, loop=None, options=None, lazy=False, paginate=False):
         self.view = view
         self.args = args
         self.kwargs = kwargs
         self.params = params
+        self.query = compile_params(params)
         self.varname = varname
+        # (loopvars, sequence) of the enclosing {% for %} tag
+        self.loop = loop
+        self.options = options or {}
+        self.lazy = lazy
+        self.paginate = paginate
 
-    def render(self, context):
-        self.context = context
-
+    def resolve(self, context):
+        view = self.view.resolve(context)
         args = [arg.resolve(context) for arg in self.args] if self.args else None
         kwargs = {k: v.resolve(context) for k, v in self.kwargs.items()} if self.kwargs else None
-        url = unquote_plus(reverse(self.view.resolve(context), args=args, kwargs=kwargs))
+        params = "&".join(filter(None, (
+            chunk if isinstance(chunk, str) else encode_params([(chunk[0], chunk[1].resolve(context))])
+            for chunk in self.query
+        )))
+        return view, args, kwargs, params
 
-        request = context["request"]
-        # calling a rest framework view it assumes that it's the original HttpRequest
-        request = getattr(request, "_request", request)
+    def render(self, context):
+        # nodes are shared between threads by the cached template loader:
+        # never store render state on self, use context.render_context
+        view, args, kwargs, params = self.resolve(context)
+        options = {name: value.resolve(context) for name, value in self.options.items()}
+        timeout, method = options.get("cache"), str(options.get("method", "GET")).upper()
+        fields = parse_fields(options.get("fields"))
+        if method not in SAFE_METHODS:
+            raise TemplateSyntaxError(_("'call' templatetag method must be one of {}").format(", ".join(SAFE_METHODS)))
+        client = Client(context["request"])
+        paginate = self.paginate or "paginate" in options
+
+        # lazy calls run in the process pool, they can't coalesce loops in render_context
+        if paginate:
+            func = functools.partial(
+                client.paginate, view, args=args, kwargs=kwargs, params=params, timeout=timeout,
+                limit=options.get("paginate"), fields=fields,
+            )
+        elif "forloop" in context and method == "GET" and not self.lazy and "timeout" not in options:
+            func = functools.partial(self.call_in_loop, context, client, view, args, kwargs, params, timeout, fields)
+        else:
+            func = functools.partial(
+                client.get, view, args=args, kwargs=kwargs, params=params, timeout=timeout,
+                method=method, fields=fields,
+            )
 
         varname = self.varname.resolve(context)
-        context[varname] = call(
-            request=request,
-            url=url,
-            qs={param[0]: str(param[1].resolve(context)) for param in self.params},
+        context[varname] = apply_options(
+            func, view=view, lazy=self.lazy, wait=options.get("timeout"), default=options.get("default", MISSING),
         )
         return ""
 
+    def call_in_loop(self, context, client, view, args, kwargs, params, timeout=None, fields=None):
+        """
+        Inside a {% for %} loop call the batch variant of view once for all the
+        iterations (or, with CALLER_PREFETCH_LOOPS, call view for all the iterations
+        concurrently), and pick the result of the current one
+        """
+        batch = get_batch(view)
+        if batch is None:
+            if settings.DEBUG and context["forloop"]["first"]:
+                warnings.warn(
+                    "{{% call '{}' %}} inside a {{% for %}} loop runs one request per iteration, "
+                    "add a batch variant to CALLER_BATCH_VIEWS".format(view),
+                    CallInLoopWarning,
+                )
+            if not conf.get("PREFETCH_LOOPS"):
+                return client.get(view, args=args, kwargs=kwargs, params=params, timeout=timeout, fields=fields)
+
+        try:
+            key = self.get_key(view, batch, args, kwargs, params)
+        except (KeyError, IndexError, TypeError):
+            return client.get(view, args=args, kwargs=kwargs, params=params, timeout=timeout, fields=fields)
+        results = context.render_context.setdefault(self, {})
+        if key not in results and self.loop is not None:
+            results.update(self.prefetch(context, client, view, batch, timeout, fields))
+        if key not in results:
+            return client.get(view, args=args, kwargs=kwargs, params=params, timeout=timeout, fields=fields)
+        return results[key]
+
+    def get_key(self, view, batch, args, kwargs, params):
+        # the results of a loop can be of different views
+        if batch is not None:
+            return view, batch.get_key(args, kwargs), params
+        key = (view, tuple(args or ()), tuple(sorted((kwargs or {}).items())), params)
+        hash(key)
+        return key
+
+    def prefetch(self, context, client, view, batch, timeout=None, fields=None):
+        """
+        Call view for every iteration of the enclosing {% for %} loop
+        """
+        loopvars, sequence = self.loop
+        calls = OrderedDict()
+        for item in sequence.resolve(context, ignore_failures=True) or []:
+            with context.push():
+                if len(loopvars) > 1:
+                    context.update(dict(zip(loopvars, item)))
+                else:
+                    context[loopvars[0]] = item
+                try:
+                    item_view, args, kwargs, params = self.resolve(context)
+                    key = self.get_key(item_view, batch, args, kwargs, params)
+                except Exception:
+                    continue
+            if item_view == view:
+                calls[key] = Call(view, args=args, kwargs=kwargs, params=params, timeout=timeout, fields=fields)
+        return dict(zip(calls, client.get_many(calls.values())))
+
+
+def compile_params(params):
+    """
+    Return the querystring of params as a list of chunks: literal params are
+    encoded once here, the (key, expression) of the others on every render
+    """
+    query = []
+    for key, value in params:
+        chunk = (key, value)
+        if is_literal(value):
+            try:
+                chunk = encode_params([(key, resolve_literal(value))])
+            except Exception:
+                pass
+            else:
+                if not chunk:
+                    continue
+                if query and isinstance(query[-1], str):
+                    chunk = "{}&{}".format(query.pop(), chunk)
+        query.append(chunk)
+    return query
+
+
+def get_loop(parser):
+    """
+    Return (loopvars, sequence) of the innermost {% for %} tag being parsed
+    """
+    for command, token in reversed(parser.command_stack):
+        if command == "for":
+            bits = token.split_contents()
+            in_index = -3 if bits[-1] == "reversed" else -2
+            if len(bits) < 4 or bits[in_index] != "in":
+                return None
+            loopvars = re.split(r" *, *", " ".join(bits[1:in_index]))
+            return loopvars, parser.compile_filter(bits[in_index + 1])
+    return None
+
 
 @register.tag(name="call")
 def call_tag(parser, token):
@@ -81,37 +223,141 @@ def call_tag(parser, token):
           <p>{{ post.text }}</p>
         </div>
     """
-    bits = token.split_contents()
+    view, args, kwargs, params, varname, options, flags = parse_bits(tuple(token.split_contents()))
+
+    view, varname = template.Variable(view), template.Variable(varname)
+    args = [parser.compile_filter(arg) for arg in args] or None
+    kwargs = {key: parser.compile_filter(value) for key, value in kwargs} or None
+    params = [[key, parser.compile_filter(value)] for key, value in params]
+    options = {key: parser.compile_filter(value) for key, value in options}
+
+    method = options.get("method")
+    if method is not None and is_literal(method) and str(resolve_literal(method)).upper() not in SAFE_METHODS:
+        raise TemplateSyntaxError(_("'call' templatetag method must be one of {}").format(", ".join(SAFE_METHODS)))
+    if conf.get("VALIDATE_VIEWS") and is_literal(view):
+        check_view(resolve_literal(view), len(args or ()), kwargs)
+
+    return CallNode(
+        view=view, args=args, kwargs=kwargs, params=params, varname=varname,
+        loop=get_loop(parser), options=options, lazy="lazy" in flags, paginate="paginate" in flags,
+    )
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_bits(bits):
+    """
+    Split the bits of a {% call %} tag into its view, args, kwargs, params,
+    varname, options and flags (as source strings, compiled by call_tag()).
+
+    Compiling the same tag again (without the cached template loader) reuses the result.
+    """
     if len(bits) < 4:
         raise TemplateSyntaxError(_("'call' templatetag has less than 3 arguments (needs 'urlconf as varname')"))
 
-    if bits[-2] != "as":
+    index = len(bits) - 2
+    while index > 1 and bits[index] != "as":
+        index -= 1
+    if bits[index] != "as":
         raise TemplateSyntaxError(_("Missing `as 'varname' as last parameters in 'call' templatag"))
 
-    view, args, kwargs, params, varname = template.Variable(bits[1]), [], {}, [], template.Variable(bits[-1])
+    args, kwargs, params, options, flags = [], [], [], [], []
+    for bit in bits[index + 2:]:
+        key, value = kwarg_re.match(bit).groups()
+        if key in OPTIONS:
+            options.append((key, value))
+        elif key is None and value in FLAGS:
+            flags.append(value)
+        else:
+            raise TemplateSyntaxError(_("Unknown option '{}' in 'call' templatetag").format(bit))
 
     is_param = False
-    for bit in bits[2:-2]:
-        if bit == 'with':
+    for bit in bits[2:index]:
+        if bit == "with":
             is_param = True
-        elif is_param:
-            key, value = bit.split("=")
-            params.append([key, parser.compile_filter(value)])
+            continue
+        key, value = kwarg_re.match(bit).groups()
+        if is_param:
+            if key is None:
+                raise TemplateSyntaxError(_("'call' templatetag params must be key=value, not '{}'").format(bit))
+            params.append((key, value))
+        elif key is None:
+            args.append(value)
         else:
-            try:
-                key, value = bit.split("=")
-            except ValueError:
-                args.append(parser.compile_filter(bit))
-            else:
-                kwargs[key] = parser.compile_filter(value)
+            kwargs.append((key, value))
 
     if args and kwargs:
         raise TemplateSyntaxError("Cannot mix args and kwargs in 'call' templatetag!")
 
-    args = args if args else None
-    kwargs = kwargs if kwargs else None
+    return bits[1], tuple(args), tuple(kwargs), tuple(params), bits[index + 1], tuple(options), tuple(flags)
+
+
+def check_view(view, nargs, kwargs):
+    """
+    Check that view is a url name of the URLconf, with a pattern for nargs
+    positional arguments or for kwargs named arguments
+    """
+    resolver = get_resolver(get_urlconf())
+    *path, name = view.split(":")
+    for namespace in path:
+        app_list = resolver.app_dict.get(namespace, [])
+        if app_list and namespace not in app_list:
+            namespace = app_list[0]
+        try:
+            prefix, resolver = resolver.namespace_dict[namespace]
+        except KeyError:
+            raise TemplateSyntaxError(_("'{}' is not a registered namespace ('call' templatetag)").format(namespace))
+    possibilities = resolver.reverse_dict.getlist(name)
+    if not possibilities:
+        raise TemplateSyntaxError(_("'{}' is not a valid view name ('call' templatetag)").format(view))
+    for possibility, pattern, defaults, converters in possibilities:
+        for result, params in possibility:
+            if kwargs:
+                if not set(kwargs).symmetric_difference(params).difference(defaults):
+                    return
+            elif len(params) == nargs:
+                return
+    raise TemplateSyntaxError(_("'{}' has no url pattern for these arguments ('call' templatetag)").format(view))
+
+
+class DeferredNode(template.Node):
+    def __init__(self, *, nodelist, placeholder):
+        self.nodelist = nodelist
+        self.placeholder = placeholder
+
+    def render(self, context):
+        deferred = context.get(DEFERRED_KEY)
+        if deferred is None:
+            return self.nodelist.render(context)
+        # render in another thread with a copy of the context, nested blocks are not deferred
+        values = context.flatten()
+        values[DEFERRED_KEY] = None
+        element_id = deferred.add(functools.partial(self.nodelist.render, context.new(values)))
+        return format_html(
+            '<div id="{}" class="caller-deferred">{}</div>', element_id, self.placeholder.render(context),
+        )
+
 
-    return CallNode(view=view, args=args, kwargs=kwargs, params=params, varname=varname)
+@register.tag(name="deferred")
+def deferred_tag(parser, token):
+    """
+    In a response streamed by caller.streaming.render_to_stream() render the block
+    in the background, and send its placeholder (if any) in the meantime.
+    Otherwise render the block in place.
+
+    Example::
+        {% deferred %}
+          {% call 'api:slow-stats' as 'stats' %}
+          <p>{{ stats.total }}</p>
+        {% placeholder %}
+          <p>loading...</p>
+        {% enddeferred %}
+    """
+    nodelist = parser.parse(("placeholder", "enddeferred"))
+    placeholder = template.NodeList()
+    if parser.next_token().contents == "placeholder":
+        placeholder = parser.parse(("enddeferred",))
+        parser.delete_first_token()
+    return DeferredNode(nodelist=nodelist, placeholder=placeholder)
 
 
 # backport of django 2.1 json_script filter
@@ -134,3 +380,28 @@ if not hasattr(defaultfilters, "json_script"):
             '<script id="{}" type="application/json">{}</script>',
             element_id, mark_safe(json_str)
         )
+
+
+_json_script = getattr(defaultfilters, "json_script", None) or json_script
+
+
+@register.simple_tag(takes_context=True)
+def caller_hydration(context, element_id="caller-hydration"):
+    """
+    Output the payloads of the calls made so far while serving the request,
+    keyed by url and querystring, to answer the same requests from javascript
+    (see caller/hydration.js). The payloads are kept only with CALLER_HYDRATION,
+    or for requests passed to caller.stats.enable_hydration()
+
+    Example::
+        {% load caller_tags static %}
+        ...
+        {% caller_hydration %}
+        <script src="{% static 'caller/hydration.js' %}"></script>
+        <script src="{% static 'app.js' %}"></script>
+    """
+    request = context.get("request")
+    if request is None:
+        return ""
+    request = getattr(request, "_request", request)
+    return _json_script(get_hydration(request), element_id)
@@ -0,0 +1,166 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from . import conf
+
+# W3C trace context header, as found in the environ
+TRACEPARENT_KEY = "HTTP_TRACEPARENT"
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+class Tracer:
+    """
+    Interface of the CALLER_TRACER tracers.
+
+    start_span() is a context manager which yields a span (with a set_attribute(key, value) method)
+    for a call made while serving environ, inject() adds the trace context of span to the environ of the call.
+    """
+    def start_span(self, name, *, environ, attributes=None):
+        raise NotImplementedError
+
+    def inject(self, span, environ):
+        raise NotImplementedError
+
+
+class Span:
+    def __init__(self, name, *, trace_id, span_id, parent_id=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.exception = None
+        self.start = time.perf_counter()
+        self.duration = None
+
+    def __repr__(self):
+        return "<Span: {}>".format(self.name)
+
+    @property
+    def traceparent(self):
+        return "00-{}-{}-01".format(self.trace_id, self.span_id)
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+
+def get_id(bits):
+    return "{:0{}x}".format(random.getrandbits(bits), bits // 4)
+
+
+class InMemoryTracer(Tracer):
+    """
+    Keep the finished spans in memory, in the order they end (children first)
+    """
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def start_span(self, name, *, environ, attributes=None):
+        match = TRACEPARENT_RE.match(environ.get(TRACEPARENT_KEY, ""))
+        trace_id, parent_id = match.groups() if match else (get_id(128), None)
+        span = Span(name, trace_id=trace_id, span_id=get_id(64), parent_id=parent_id, attributes=attributes)
+        try:
+            yield span
+        except Exception as exc:
+            span.exception = exc
+            raise
+        finally:
+            span.duration = time.perf_counter() - span.start
+            with self._lock:
+                self.spans.append(span)
+
+    def inject(self, span, environ):
+        environ[TRACEPARENT_KEY] = span.traceparent
+
+    def clear(self):
+        with self._lock:
+            self.spans = []
+
+
+class OpenTelemetryTracer(Tracer):
+    """
+    Export the spans with the OpenTelemetry API (the SDK is configured by the project)
+    """
+    def __init__(self, name="caller"):
+        from opentelemetry import propagate, trace
+
+        self.propagate = propagate
+        self.trace = trace
+        self.tracer = trace.get_tracer(name)
+
+    @contextmanager
+    def start_span(self, name, *, environ, attributes=None):
+        context = None
+        if not self.trace.get_current_span().get_span_context().is_valid:
+            # a call running in a worker thread: continue the trace of environ
+            headers = {
+                key[5:].replace("_", "-").lower(): value
+                for key, value in environ.items() if key.startswith("HTTP_")
+            }
+            context = self.propagate.extract(headers)
+        with self.tracer.start_as_current_span(name, context=context, attributes=attributes) as span:
+            yield span
+
+    def inject(self, span, environ):
+        headers = {}
+        self.propagate.inject(headers, context=self.trace.set_span_in_context(span))
+        for key, value in headers.items():
+            environ["HTTP_{}".format(key.upper().replace("-", "_"))] = value
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    """
+    Return the CALLER_TRACER tracer (a Tracer or the dotted path of a Tracer class), or None
+    """
+    global _tracer
+    value = conf.get("TRACER")
+    if not isinstance(value, str):
+        return value
+    tracer = _tracer
+    if tracer is not None and tracer[0] == value:
+        return tracer[1]
+    with _tracer_lock:
+        if _tracer is None or _tracer[0] != value:
+            _tracer = (value, import_string(value)())
+        return _tracer[1]
+
+
+@receiver(setting_changed)
+def reset(*, setting, **kwargs):
+    global _tracer
+    if setting == "CALLER_TRACER":
+        _tracer = None
@@ -18,16 +18,41 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import functools
 import json
+import logging
+import threading
+import time
+from contextlib import ExitStack
 from io import StringIO
 from urllib.parse import quote_plus, urlencode
 from wsgiref.handlers import BaseHandler
 
-from django.core.handlers.wsgi import WSGIHandler as BaseAppHandler
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.core.handlers.wsgi import WSGIHandler as BaseAppHandler, WSGIRequest, get_script_name
+from django.core.signals import setting_changed
+from django.db import connections
+from django.dispatch import receiver
+from django.urls import set_script_prefix
+from django.utils import translation
+from django.utils.module_loading import import_string
+
+from . import cache, conf, snapshot, tracing
+from .exceptions import QueryBudgetExceeded, ResponseTooLarge
+from .fields import add_fields_param, parse_fields, project
+from .singleflight import flights
+from .stats import DEPTH_KEY, QueryCounter, get_stats, is_hydration_enabled
+
+logger = logging.getLogger("caller")
+
+EXCEPTION_KEY = "caller.exception"
+PARENT_KEY = "caller.parent"
 
 
 class CallHandler(BaseHandler):
-    def __init__(self, *, environ, multithread=True, multiprocess=False):
+    def __init__(self, *, environ, multithread=True, multiprocess=False, max_size=None):
         self.stdin = StringIO()
         self.stdout = StringIO()
         self.stderr = StringIO()
@@ -35,7 +60,43 @@ class CallHandler(BaseHandler):
         self.wsgi_multithread = multithread
         self.wsgi_multiprocess = multiprocess
         self.headers_sent = True
-        self.content = ""
+        self.chunks = []
+        self.size = 0
+        # maximum size of the response, in bytes
+        self.max_size = max_size
+        self.status_code = None
+        # raised by fetch() once the handler is done
+        self.exception = None
+
+    @property
+    def content(self):
+        return b"".join(self.chunks)
+
+    def too_large(self):
+        return ResponseTooLarge("The response of {} is larger than {} bytes".format(
+            self.environ["PATH_INFO"], self.max_size,
+        ))
+
+    def start_response(self, status, headers, exc_info=None):
+        write = super().start_response(status, headers, exc_info)
+        length = self.headers.get("Content-Length")
+        if self.max_size is not None and length and int(length) > self.max_size:
+            # don't read the response
+            self.exception = self.too_large()
+        return write
+
+    def finish_response(self):
+        """
+        Read the response (unless it's too large) and close it, even on errors
+        """
+        try:
+            if self.exception is None:
+                for data in self.result:
+                    self.write(data)
+        except Exception as exc:
+            self.exception = self.exception or exc
+        finally:
+            self.close()
 
     def setup_environ(self):
         pass
@@ -50,39 +111,393 @@ class CallHandler(BaseHandler):
         return self.environ
 
     def _write(self, data):
-        self.content = data
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            raise self.too_large()
+        self.chunks.append(data)
 
     def _flush(self):
         pass
 
+    def close(self):
+        """
+        Close the response without sending request_finished
+        (it would close the database connections shared with the original request)
+        """
+        if self.status:
+            self.status_code = int(self.status.split(" ", 1)[0])
+        result, self.result = self.result, None
+        for closable in getattr(result, "_closable_objects", []):
+            try:
+                closable.close()
+            except Exception:
+                pass
+        super().close()
+
+
+class CallRequest(WSGIRequest):
+    """
+    Request of a call, which shares CALLER_SHARED_ATTRIBUTES with the original
+    request when CALLER_SHARE_REQUEST is set
+    """
+    def __init__(self, environ):
+        super().__init__(environ)
+        parent = environ.get(PARENT_KEY)
+        if parent is not None:
+            values = vars(parent)
+            for name in conf.get("SHARED_ATTRIBUTES"):
+                if name in values:
+                    setattr(self, name, values[name])
+
 
 class AppHandler(BaseAppHandler):
-    caller_exception = None
+    """
+    WSGI application which runs the calls through the given middleware
+    (default settings.MIDDLEWARE)
+    """
+    request_class = CallRequest
+
+    def __init__(self, middleware=None):
+        self.middleware = settings.MIDDLEWARE if middleware is None else middleware
+        super().__init__()
+
+    def load_middleware(self):
+        """
+        Same as BaseHandler.load_middleware(), but with self.middleware
+        """
+        if self.middleware is None:
+            # settings.MIDDLEWARE = None: django 1.11 loads the old style MIDDLEWARE_CLASSES
+            return super().load_middleware()
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+
+        handler = convert_exception_to_response(self._get_response)
+        for middleware_path in reversed(self.middleware):
+            middleware = import_string(middleware_path)
+            try:
+                mw_instance = middleware(handler)
+            except MiddlewareNotUsed:
+                continue
+
+            if mw_instance is None:
+                raise ImproperlyConfigured("Middleware factory %s returned None." % middleware_path)
+
+            if hasattr(mw_instance, "process_view"):
+                self._view_middleware.insert(0, mw_instance.process_view)
+            if hasattr(mw_instance, "process_template_response"):
+                self._template_response_middleware.append(mw_instance.process_template_response)
+            if hasattr(mw_instance, "process_exception"):
+                self._exception_middleware.append(mw_instance.process_exception)
+
+            handler = convert_exception_to_response(mw_instance)
+
+        self._middleware_chain = handler
+
+    def __call__(self, environ, start_response):
+        """
+        Same as WSGIHandler.__call__(), but a call is part of the original request,
+        so request_started is not sent
+        (it would close the shared database connections and reset their queries log)
+        """
+        set_script_prefix(get_script_name(environ))
+        request = self.request_class(environ)
+        response = self.get_response(request)
+
+        response._handler_class = self.__class__
+
+        status = "%d %s" % (response.status_code, response.reason_phrase)
+        response_headers = list(response.items())
+        for c in response.cookies.values():
+            response_headers.append(("Set-Cookie", c.output(header="")))
+        start_response(status, response_headers)
+        return response
 
     def process_exception_by_middleware(self, exception, request):
         """
         Grab called exception, so can be reraised and shown it
-        instead of JSONDecodeError in CallNode.render() method
+        instead of JSONDecodeError in CallNode.render() method.
+        The handler is shared between calls, so it is stored in the call environ.
         """
-        self.caller_exception = exception
-        super().process_exception_by_middleware(exception, request)
+        request.environ[EXCEPTION_KEY] = exception
+        return super().process_exception_by_middleware(exception, request)
+
+
+_apps = {}
+_apps_lock = threading.Lock()
 
 
-def call(request, url, qs=None):
-        environ = request.environ.copy()
-        environ["PATH_INFO"] = url
-        environ["REQUEST_METHOD"] = "GET"
-        environ["CONTENT_TYPE"] = "application/json"
-        environ["QUERY_STRING"] = urlencode(qs, quote_via=quote_plus) if qs else ""
+def get_middleware(view, shared=False):
+    """
+    Return the middleware to run for a call to view: its CALLER_MIDDLEWARE_PROFILES entry,
+    or CALLER_MIDDLEWARE, or settings.MIDDLEWARE, without CALLER_SHARED_MIDDLEWARE
+    when the call shares the attributes of the original request.
 
-        handler = CallHandler(environ=environ)
-        app = AppHandler()
-        handler.run(app)
-        response = handler.content.decode("utf-8") if isinstance(handler.content, bytes) else handler.content
+    Return None for projects with settings.MIDDLEWARE = None (django 1.11 MIDDLEWARE_CLASSES),
+    whose middleware is loaded by django.
+    """
+    middleware = conf.get_for_view("MIDDLEWARE_PROFILES", view)
+    if middleware is None:
+        middleware = conf.get("MIDDLEWARE")
+    if middleware is None:
+        middleware = settings.MIDDLEWARE
+    if middleware is None:
+        return None
+    if shared:
+        # the shared attributes are already set
+        shared = set(conf.get("SHARED_MIDDLEWARE"))
+        middleware = [path for path in middleware if path not in shared]
+    return tuple(middleware)
 
+
+def get_app(view=None, shared=False):
+    """
+    Return the (cached) AppHandler for calls to view
+    """
+    middleware = get_middleware(view, shared)
+    try:
+        return _apps[middleware]
+    except KeyError:
+        with _apps_lock:
+            if middleware not in _apps:
+                _apps[middleware] = AppHandler(middleware=middleware)
+            return _apps[middleware]
+
+
+@receiver(setting_changed)
+def reset_apps(*, setting, **kwargs):
+    if setting in {"MIDDLEWARE", "MIDDLEWARE_CLASSES", "CALLER_MIDDLEWARE", "CALLER_MIDDLEWARE_PROFILES"}:
+        with _apps_lock:
+            _apps.clear()
+
+
+def check_query_budget(view, url, counter):
+    budget = conf.get_for_view("QUERY_BUDGET", view)
+    if budget is None or counter.count <= budget:
+        return
+    message = "call to {} run {} queries, more than its budget of {}".format(url, counter.count, budget)
+    if conf.get("QUERY_BUDGET_ACTION") == "raise":
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+def can_share(request):
+    """
+    Return whether the calls of request can share its CALLER_SHARED_ATTRIBUTES:
+    requests built in code (or by caller_warm) have no session and user, their calls
+    run the whole middleware
+    """
+    if not conf.get("SHARE_REQUEST"):
+        return False
+    values = vars(request)
+    return all(name in values for name in conf.get("SHARED_ATTRIBUTES"))
+
+
+def get_environ(request, url, qs, *, method="GET", span=None):
+    """
+    Return the environ of a call made while serving request
+    """
+    environ = request.environ.copy()
+    environ["PATH_INFO"] = url
+    environ["REQUEST_METHOD"] = method
+    environ["CONTENT_TYPE"] = "application/json"
+    environ["QUERY_STRING"] = qs
+    environ[DEPTH_KEY] = request.environ.get(DEPTH_KEY, 0) + 1
+    environ.pop(EXCEPTION_KEY, None)
+    environ[PARENT_KEY] = request if can_share(request) else None
+    # the payload is parsed, don't let GZipMiddleware compress it
+    environ.pop("HTTP_ACCEPT_ENCODING", None)
+    if span is not None:
+        tracing.get_tracer().inject(span, environ)
+    return environ
+
+
+def fetch(request, url, qs, *, view=None, method="GET", span=None):
+    """
+    Run the call and return its raw payload, its status code and the exception raised by the view, if any
+    """
+    environ = get_environ(request, url, qs, method=method, span=span)
+    handler = CallHandler(environ=environ, max_size=get_max_size(request, view))
+    handler.run(get_app(view, shared=environ[PARENT_KEY] is not None))
+    if span is not None:
+        span.set_attribute("http.status_code", handler.status_code or 0)
+        span.set_attribute("http.response_content_length", handler.size)
+    if handler.exception is not None:
+        raise handler.exception
+    return handler.content, handler.status_code, environ.get(EXCEPTION_KEY)
+
+
+def get_max_size(request, view):
+    """
+    Return the maximum size of the response of a call to view: CALLER_MAX_RESPONSE_SIZE,
+    or what is left of CALLER_MAX_REQUEST_SIZE for request if it's less
+    """
+    max_size = conf.get_for_view("MAX_RESPONSE_SIZE", view)
+    max_request_size = conf.get("MAX_REQUEST_SIZE")
+    if max_request_size is not None:
+        left = max(max_request_size - get_stats(request).bytes, 0)
+        max_size = left if max_size is None else min(max_size, left)
+    return max_size
+
+
+def get_flight_key(request, url, qs, view):
+    """
+    Return the single flight key of a call: calls with the same key get the same response
+    (payloads have absolute urls, so it depends on the scheme too)
+    """
+    environ = request.environ
+    vary = tuple(environ.get(key) for key in conf.get("SINGLE_FLIGHT_VARY"))
+    return view, url, qs, translation.get_language(), request.scheme, vary
+
+
+def dispatch(request, url, qs, *, view=None, method="GET", span=None, stats=None):
+    """
+    Run the call and return its decoded payload. With CALLER_SNAPSHOT_MODE the
+    payload is recorded in the snapshot, or replayed from it (see caller.snapshot)
+    """
+    mode = snapshot.get_mode()
+    if mode == "replay":
+        entry = snapshot.get_snapshot().get(method, url, qs)
+        if stats is not None:
+            stats.status = entry["status"]
+        if span is not None:
+            span.set_attribute("caller.snapshot", True)
+        return entry["data"]
+    data = run(request, url, qs, view=view, method=method, span=span, stats=stats)
+    if mode == "record":
+        status = stats.status if stats is not None else None
+        snapshot.get_snapshot().record(method, url, qs, status=status, data=data)
+    return data
+
+
+def run(request, url, qs, *, view=None, method="GET", span=None, stats=None):
+    if method == "GET" and conf.get_for_view("DRF_FAST_PATH", view):
+        from . import drf
+
+        data = drf.dispatch(request, url, qs, view=view, span=span, stats=stats)
+        if data is not drf.NOT_DRF:
+            return data
+    if method == "GET" and conf.get_for_view("SINGLE_FLIGHT", view):
+        # concurrent identical calls share the raw payload, every one decodes its own copy
+        key = get_flight_key(request, url, qs, view)
+        func = functools.partial(fetch, request, url, qs, view=view, method=method, span=span)
+        (content, status, exception), shared = flights.do(key, func)
+        if span is not None and shared:
+            span.set_attribute("caller.shared", True)
+    else:
+        content, status, exception = fetch(request, url, qs, view=view, method=method, span=span)
+    if stats is not None:
+        stats.bytes, stats.status = len(content), status
+    response = content.decode("utf-8")
+
+    if not response and method != "GET":
+        # HEAD and OPTIONS responses can have no payload
+        return None
+    start = time.perf_counter()
+    try:
+        return json.loads(response)
+    except Exception:
+        if exception is not None:
+            raise exception
+        raise
+    finally:
+        if span is not None:
+            span.set_attribute("caller.decode_time", time.perf_counter() - start)
+
+
+def encode_params(params):
+    """
+    Return params (a dict, a list of (key, value) or an already encoded string)
+    as an encoded querystring, repeating the key of list and tuple values
+    """
+    if not params:
+        return ""
+    if isinstance(params, str):
+        return params
+    if hasattr(params, "lists"):
+        params = params.lists()
+    elif hasattr(params, "items"):
+        params = params.items()
+    # only lists and tuples are repeated: other values (lazy translations too) are str()
+    pairs = []
+    for key, value in params:
+        if isinstance(value, (list, tuple)):
+            pairs.extend((key, item) for item in value)
+        else:
+            pairs.append((key, value))
+    return urlencode(pairs, quote_via=quote_plus)
+
+
+def call(request, url, qs=None, *, view=None, timeout=None, refresh=False, method="GET", fields=None, with_status=False):  # noqa: E501
+    """
+    Call url and return its decoded json payload.
+    qs is a dict, a list of (key, value) or an already encoded querystring.
+
+    When a cache timeout is given (or configured for view in CALLER_CACHE_VIEWS)
+    the payload is stored in the CALLER_CACHE cache and reused, unless refresh is true.
+    Only the payloads of successful (status < 400) responses are cached.
+    method is GET (the only cached one), HEAD or OPTIONS.
+    With with_status (data, status code of the response) is returned.
+
+    fields (a comma separated string or a list) are passed to the view as the
+    CALLER_FIELDS_PARAM param, and the payload is projected on them (see caller.fields).
+
+    Every call is recorded in the request stats (see caller.stats.get_stats()),
+    with its database queries if CALLER_QUERIES or CALLER_QUERY_BUDGET are set,
+    and traced as a span by the CALLER_TRACER tracer (see caller.tracing).
+    """
+    qs = encode_params(qs)
+    fields = parse_fields(fields)
+    qs = add_fields_param(qs, fields)
+    depth = request.environ.get(DEPTH_KEY, 0)
+    stats = get_stats(request).add(view=view, url=url, qs=qs, depth=depth)
+    # keep the payloads for {% caller_hydration %} only when asked, and only of top level calls
+    hydrate = depth == 0 and is_hydration_enabled(request)
+    tracer = tracing.get_tracer()
+    start = time.perf_counter()
+    with ExitStack() as stack:
+        span = None
+        if tracer is not None:
+            span = stack.enter_context(tracer.start_span(view or url, environ=request.environ, attributes={
+                "caller.view": view or "",
+                "caller.depth": depth,
+                "http.method": method,
+                "http.url": "{}?{}".format(url, qs) if qs else url,
+            }))
         try:
-            return json.loads(response)
-        except Exception:
-            if app.caller_exception:
-                raise app.caller_exception
-            raise
+            if method != "GET":
+                timeout = None
+            elif timeout is None:
+                timeout = cache.get_timeout(view)
+            if timeout:
+                key = cache.make_key(request, url, qs)
+                data = None if refresh else cache.get(key, timeout)
+                if data is not None:
+                    stats.cached, stats.status = True, 200
+                    if hydrate:
+                        stats.data = data
+                    if span is not None:
+                        span.set_attribute("caller.cached", True)
+                    return (data, stats.status) if with_status else data
+
+            if conf.get("QUERIES") or conf.get("QUERY_BUDGET") is not None:
+                counter = QueryCounter()
+                with ExitStack() as queries:
+                    for connection in connections.all():
+                        queries.enter_context(connection.execute_wrapper(counter))
+                    data = dispatch(request, url, qs, view=view, method=method, span=span, stats=stats)
+                stats.queries, stats.query_time = counter.count, counter.time
+                check_query_budget(view, url, counter)
+            else:
+                data = dispatch(request, url, qs, view=view, method=method, span=span, stats=stats)
+
+            if fields:
+                data = project(data, fields)
+            if timeout and (stats.status or 200) < 400:
+                data = cache.set(key, data, timeout)
+            # hydration.js serves the payloads as successful responses
+            if hydrate and (stats.status or 200) < 400:
+                stats.data = data
+            return (data, stats.status) if with_status else data
+        finally:
+            stats.duration = time.perf_counter() - start
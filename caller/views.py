@@ -0,0 +1,119 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import json
+
+from django.http import Http404, JsonResponse
+from django.urls import NoReverseMatch, resolve
+from django.views import View
+
+from . import conf
+from .client import Call, Client
+
+
+class BatchView(View):
+    """
+    Run many calls in a single request and return their results, in order.
+
+    POST a json list of calls, by view name or by path
+
+        [
+            {"view": "api:post-list", "params": {"amount": 2}},
+            {"view": "api:post-detail", "args": [1, "post-1"]},
+            {"path": "/api/posts/2/post-2"}
+        ]
+
+    and get
+
+        {"results": [{"status": 200, "data": ...}, {"status": 200, "data": ...}, {"status": 403, "error": ...}]}
+
+    Only views in allowed (view names or namespaces, default CALLER_BATCH_ALLOWED) can be called,
+    up to max_calls (default CALLER_BATCH_MAX_CALLS) per request.
+    """
+    allowed = None
+    max_calls = None
+
+    def get_allowed(self):
+        return conf.get("BATCH_ALLOWED") if self.allowed is None else self.allowed
+
+    def get_max_calls(self):
+        return conf.get("BATCH_MAX_CALLS") if self.max_calls is None else self.max_calls
+
+    def is_allowed(self, view):
+        allowed = set(self.get_allowed())
+        while view:
+            if view in allowed:
+                return True
+            view = view.rpartition(":")[0]
+        return False
+
+    def error(self, status, message):
+        return {"status": status, "error": message}
+
+    def get_call(self, entry):
+        """
+        Return the Call for entry, or an error
+        """
+        if not isinstance(entry, dict):
+            return self.error(400, "a call must be an object")
+        if "path" in entry:
+            try:
+                match = resolve(entry["path"])
+            except Http404:
+                return self.error(404, "{} not found".format(entry["path"]))
+            view, args, kwargs = match.view_name, match.args, match.kwargs
+        elif "view" in entry:
+            view, args, kwargs = entry["view"], entry.get("args"), entry.get("kwargs")
+        else:
+            return self.error(400, "a call needs a view or a path")
+        if not isinstance(view, str) or not self.is_allowed(view):
+            return self.error(403, "{} is not allowed".format(view))
+        try:
+            call = Call(view, args=args, kwargs=kwargs, params=entry.get("params"))
+        except (TypeError, ValueError):
+            return self.error(400, "invalid params")
+        try:
+            match = resolve(call.url)
+        except (Http404, NoReverseMatch, TypeError, ValueError):
+            return self.error(404, "{} not found".format(view))
+        if issubclass(getattr(match.func, "view_class", object), BatchView):
+            return self.error(403, "{} is a batch view".format(view))
+        return call
+
+    def post(self, request, *args, **kwargs):
+        try:
+            entries = json.loads(request.body.decode("utf-8"))
+        except ValueError:
+            return JsonResponse(self.error(400, "invalid json"), status=400)
+        if not isinstance(entries, list):
+            return JsonResponse(self.error(400, "expected a list of calls"), status=400)
+        if len(entries) > self.get_max_calls():
+            return JsonResponse(self.error(400, "too many calls"), status=400)
+
+        results = [self.get_call(entry) for entry in entries]
+        calls = [(index, call) for index, call in enumerate(results) if isinstance(call, Call)]
+        data = Client(request).get_many([call for index, call in calls], return_exceptions=True, return_status=True)
+        for (index, call), value in zip(calls, data):
+            if isinstance(value, Exception):
+                results[index] = self.error(500, "{} failed".format(call.view))
+            else:
+                value, status = value
+                results[index] = {"status": status or 200, "data": value}
+        return JsonResponse({"results": results})
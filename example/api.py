@@ -18,6 +18,8 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+from caller.fields import get_fields
+from django.core.paginator import Paginator
 from django.http import JsonResponse
 from django.http import Http404, JsonResponse
 from django.urls import reverse
@@ -28,30 +30,45 @@ from .models import Post
 
 class PostMixin:
     def get_queryset(self):
-        return Post.objects.all()
+        posts = Post.objects.all()
+        # load only the asked fields (and the slug, used by the detail view and the links)
+        fields = get_fields(self.request)
+        if fields is not None:
+            posts = posts.only("slug", *(field for field in fields if field in ("title", "text")))
+        return posts
 
     def serialize(self, post):
         request = self.request
-        return {
-            "id": post.pk,
-            "title": post.title,
-            "text": post.text,
-            "slug": post.slug,
-            "_links": {
+        fields = get_fields(request)
+        data = {"id": post.pk}
+        data.update((field, getattr(post, field)) for field in ("title", "text", "slug") if fields is None or field in fields)  # noqa: E501
+        if fields is None or "_links" in fields:
+            data["_links"] = {
                 "path": request.build_absolute_uri(),
                 "detail": request.build_absolute_uri(reverse('api:post-detail', args=[post.pk, post.slug])),
                 "view": request.build_absolute_uri(reverse('blog:post-detail', args=[post.pk, post.slug])),
-            },
-        }
+            }
+        return data
 
 
 class PostListView(PostMixin, View):
     def get(self, request, *args, **kwargs):
-        return JsonResponse({
+        posts = self.get_queryset()
+        payload = {
             "url": request.build_absolute_uri(),
             "status": 200,
-            "data": [self.serialize(post) for post in self.get_queryset()],
-        })
+        }
+        # ?page_size=10&page=2 returns a page, with the total count and the link to the next page
+        if request.GET.get("page_size"):
+            page = Paginator(posts.order_by("pk"), int(request.GET["page_size"])).get_page(request.GET.get("page"))
+            payload["count"], payload["next"] = page.paginator.count, None
+            if page.has_next():
+                query = request.GET.copy()
+                query["page"] = page.next_page_number()
+                payload["next"] = request.build_absolute_uri("?" + query.urlencode())
+            posts = page.object_list
+        payload["data"] = [self.serialize(post) for post in posts]
+        return JsonResponse(payload)
 
 
 class PostDetailView(PostMixin, View):
@@ -69,6 +86,21 @@ class PostDetailView(PostMixin, View):
         }, status=status)
 
 
+class PostBatchView(PostMixin, View):
+    """
+    Batch variant of PostDetailView: ?id=1&id=2 returns the detail payload of every post, by id
+    """
+    def get(self, request, *args, **kwargs):
+        ids = [int(id) for id in request.GET.getlist("id")]
+        return JsonResponse({
+            str(post.pk): {
+                "url": request.build_absolute_uri(reverse('api:post-detail', args=[post.pk, post.slug])),
+                "status": 200,
+                "data": self.serialize(post),
+            } for post in self.get_queryset().filter(pk__in=ids)
+        })
+
+
 class RaiseExceptionView(View):
     def get(self, request, *args, **kwargs):
         raise 1/0
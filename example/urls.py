@@ -23,13 +23,16 @@ try:
     from django.urls import include, re_path as url
 except ImportError:
     from django.conf.urls import include, url
+from caller.views import BatchView
 from django.views.generic import RedirectView
 
 from . import api, views
 
 api_patterns = [
+    url(r'^batch$', BatchView.as_view(allowed=['api']), name='batch'),
     url(r'^raise-exception$', api.RaiseExceptionView.as_view(), name='raise-exception'),
     url(r'^posts/(?P<id>.+)/(?P<slug>.+)$', api.PostDetailView.as_view(), name='post-detail'),
+    url(r'^posts/batch$', api.PostBatchView.as_view(), name='post-batch'),
     url(r'^posts$', api.PostListView.as_view(), name='post-list'),
 ]
 
@@ -0,0 +1,63 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# rest framework views and urls for test_drf
+
+from django.urls import include, re_path
+from example.models import Post
+from rest_framework import serializers, viewsets
+from rest_framework.response import Response
+from rest_framework.throttling import BaseThrottle
+from rest_framework.views import APIView
+
+
+class DenyThrottle(BaseThrottle):
+    def allow_request(self, request, view):
+        return False
+
+
+class WhoAmIView(APIView):
+    throttle_classes = [DenyThrottle]
+
+    def get(self, request):
+        return Response({"user": request.user.username, "page": request.query_params.get("page")})
+
+
+class PostSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Post
+        fields = ["id", "title", "slug"]
+
+
+class PostViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = Post.objects.order_by("id")
+    serializer_class = PostSerializer
+
+
+drf_patterns = [
+    re_path(r"^whoami$", WhoAmIView.as_view(), name="whoami"),
+    re_path(r"^posts$", PostViewSet.as_view({"get": "list"}), name="post-list"),
+    re_path(r"^posts/(?P<pk>\d+)$", PostViewSet.as_view({"get": "retrieve"}), name="post-detail"),
+]
+
+urlpatterns = [
+    re_path(r"^drf/", include((drf_patterns, "drf"))),
+    re_path(r"^", include("example.urls")),
+]
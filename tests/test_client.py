@@ -0,0 +1,155 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from unittest import mock
+
+import caller
+from caller.fields import project
+from caller.pagination import Paginated
+from caller.utils import call
+from django.core.cache import caches
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import translation
+from example.models import Post
+
+from .test_tags import POSTS
+
+
+class TestClient(TestCase):
+    def setUp(self):
+        self.posts = [Post.objects.create(**post) for post in POSTS]
+        self.request = RequestFactory().get("/")
+
+    def tearDown(self):
+        caches["default"].clear()
+
+    def test_get(self):
+        data = caller.get("api:post-list", request=self.request)
+        self.assertEqual(len(data["data"]), 4)
+        data = caller.get("api:post-detail", request=self.request, args=[4, "post 4"], params={"full": 1})
+        self.assertEqual(data["data"]["slug"], "post 4")
+        self.assertEqual(data["url"], "http://testserver/api/posts/4/post%204?full=1")
+        data = caller.Client(self.request).get("api:post-detail", kwargs={"id": 2, "slug": "post-2"})
+        self.assertEqual(data["data"]["slug"], "post-2")
+        data = caller.get("api:post-batch", request=self.request, params="id=1&id=3")
+        self.assertEqual(sorted(data), ["1", "3"])
+        data = caller.get("api:post-batch", request=self.request, params={"id": [2, 4]})
+        self.assertEqual(sorted(data), ["2", "4"])
+
+    def test_get_cached(self):
+        with mock.patch("caller.utils.dispatch", side_effect=lambda *args, **kwargs: {"cached": False}) as dispatch:
+            self.assertEqual(caller.get("api:post-list", request=self.request, timeout=60), {"cached": False})
+            self.assertEqual(caller.get("api:post-list", request=self.request, timeout=60), {"cached": False})
+        self.assertEqual(dispatch.call_count, 1)
+
+    def test_error_not_cached(self):
+        client = caller.Client(self.request)
+        data, status = client.get("api:post-detail", args=[9, "post-9"], timeout=60, with_status=True)
+        self.assertEqual((data["status"], status), (404, 404))
+        Post.objects.create(id=9, title="post 9", slug="post-9", text="text for post 9")
+        data = caller.get("api:post-detail", request=self.request, args=[9, "post-9"], timeout=60)
+        self.assertEqual(data["status"], 200)
+
+    @override_settings(CALLER_BATCH_VIEWS={"api:post-detail": "api:post-batch"})
+    def test_get_many_batch(self):
+        calls = [caller.Call("api:post-detail", args=[post["id"], post["slug"]]) for post in POSTS]
+        calls.append(caller.Call("api:post-detail", args=[1, "post-1"]))
+        with mock.patch("caller.client.call", wraps=call) as mocked:
+            results = caller.get_many(calls, request=self.request)
+        self.assertEqual(mocked.call_count, 1)
+        self.assertEqual([result["data"]["slug"] for result in results], [
+            "post-1", "post-2", "post-3", "post 4", "post-1",
+        ])
+
+
+class TestFields(TestCase):
+    def setUp(self):
+        self.posts = [Post.objects.create(**post) for post in POSTS]
+        self.request = RequestFactory().get("/")
+
+    def test_get(self):
+        data = caller.get("api:post-list", request=self.request, params={"q": 1}, fields="title, slug")
+        self.assertEqual(data["url"], "http://testserver/api/posts?q=1&fields=title%2Cslug")
+        self.assertEqual(data["data"][0], {"title": "post 1", "slug": "post-1"})
+        data = caller.get("api:post-detail", request=self.request, args=[1, "post-1"], fields=["id", "_links"])
+        self.assertEqual(sorted(data["data"]), ["_links", "id"])
+        posts = caller.paginate("api:post-list", request=self.request, params={"page_size": 3}, fields=["slug"])
+        self.assertEqual(list(posts), [{"slug": post["slug"]} for post in POSTS])
+
+    def test_project(self):
+        # a view which ignores the fields param
+        payload = {"count": 1, "results": [{"id": 1, "title": "post 1", "text": "text"}]}
+        with mock.patch("caller.utils.dispatch", return_value=payload) as dispatch:
+            data = caller.call(self.request, "/api/posts", "page=2", fields=["id", "title", "missing"])
+        self.assertEqual(dispatch.call_args[0][2], "page=2&fields=id%2Ctitle%2Cmissing")
+        self.assertEqual(data, {"count": 1, "results": [{"id": 1, "title": "post 1"}]})
+        self.assertEqual(project([{"id": 1, "title": "post 1"}, 2], ["title"]), [{"title": "post 1"}, 2])
+        self.assertEqual(project({"id": 1, "title": "post 1"}, ["id"]), {"id": 1})
+
+
+class TestPaginated(TestCase):
+    def setUp(self):
+        self.posts = [Post.objects.create(**post) for post in POSTS]
+        self.request = RequestFactory().get("/")
+
+    def test_next_links(self):
+        with mock.patch("caller.client.call", wraps=call) as mocked:
+            posts = caller.paginate("api:post-list", request=self.request, params={"page_size": 3})
+            self.assertEqual(mocked.call_count, 0)
+            self.assertEqual(len(posts), 4)
+            self.assertEqual(mocked.call_count, 1)
+            for post in posts:
+                break
+            self.assertEqual(post["slug"], "post-1")
+            self.assertEqual(mocked.call_count, 1)
+            self.assertEqual([post["slug"] for post in posts], ["post-1", "post-2", "post-3", "post 4"])
+            self.assertEqual(mocked.call_count, 2)
+        self.assertEqual(posts[-1]["slug"], "post 4")
+        self.assertEqual(posts.pages, 2)
+
+    def test_page_param(self):
+        pages = {"": [1, 2], "page=2": [3, 4], "page=3": [5], "page=4": []}
+        fetch = mock.Mock(side_effect=lambda url, qs: {"results": pages[qs]})
+        items = Paginated(fetch, "/items", "")
+        self.assertEqual(items[:3], [1, 2, 3])
+        self.assertEqual(fetch.call_count, 2)
+        self.assertEqual(list(items), [1, 2, 3, 4, 5])
+        self.assertEqual(fetch.call_count, 4)
+        self.assertEqual(len(Paginated(fetch, "/items", "", limit=3)), 3)
+        with override_settings(CALLER_PAGINATE_LIMIT=1):
+            self.assertEqual(list(Paginated(fetch, "/items", "")), [1])
+
+
+class TestClientConcurrency(TransactionTestCase):
+    def setUp(self):
+        self.posts = [Post.objects.create(**post) for post in POSTS]
+        self.request = RequestFactory().get("/")
+
+    def test_get_many(self):
+        calls = [caller.Call("api:post-detail", args=[post["id"], post["slug"]]) for post in POSTS]
+        calls.insert(0, caller.Call("api:post-list"))
+        with translation.override("it"):
+            with mock.patch("caller.executor.translation.override", wraps=translation.override) as override:
+                results = caller.get_many(calls, request=self.request)
+        self.assertEqual(len(results[0]["data"]), 4)
+        self.assertEqual([result["data"]["slug"] for result in results[1:]], ["post-1", "post-2", "post-3", "post 4"])
+        # every call run in a worker thread with the language of the calling thread
+        self.assertEqual(override.call_count, 5)
+        self.assertEqual({args for args, kwargs in override.call_args_list}, {("it",)})
@@ -0,0 +1,160 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import json
+import os
+import tempfile
+from io import StringIO
+
+from caller import cache
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import RequestFactory, TransactionTestCase, override_settings
+from django.utils import translation
+from example.models import Post
+
+from .test_tags import POSTS
+
+
+@override_settings(CALLER_CACHE_VIEWS={"api": 60}, CALLER_WARM=["api:post-list"])
+class TestWarm(TransactionTestCase):
+    def setUp(self):
+        self.posts = [Post.objects.create(**post) for post in POSTS]
+
+    def tearDown(self):
+        caches["default"].clear()
+
+    def test_warm(self):
+        out = StringIO()
+        call_command("caller_warm", "--no-templates", "--host=example.com", "--host=https://example.org", stdout=out)
+        self.assertIn("api:post-list /api/posts", out.getvalue())
+        self.assertIn("(https://example.org)", out.getvalue())
+        # the server name and port of the requests are the bind address of the wsgi server
+        factory = RequestFactory(SERVER_NAME="0.0.0.0", SERVER_PORT="8000")
+        with translation.override(settings.LANGUAGE_CODE):
+            for request in [factory.get("/", HTTP_HOST="example.com"), factory.get("/", HTTP_HOST="example.org", secure=True)]:  # noqa: E501
+                data = cache.get(cache.make_key(request, "/api/posts", ""))
+                self.assertEqual(len(data["data"]), 4)
+                self.assertEqual(data["url"], request.build_absolute_uri("/api/posts"))
+            # other hosts and schemes are not served the payloads of these ones
+            request = RequestFactory(HTTP_HOST="example.com").get("/", secure=True)
+            self.assertIsNone(cache.get(cache.make_key(request, "/api/posts", "")))
+
+    @override_settings(ALLOWED_HOSTS=["example.com", ".example.org", "*.example.net"])
+    def test_warm_allowed_hosts(self):
+        out = StringIO()
+        call_command("caller_warm", "--no-templates", stdout=out)
+        self.assertIn("(http://example.com)", out.getvalue())
+        self.assertIn("(http://example.org)", out.getvalue())
+        self.assertNotIn("example.net", out.getvalue())
+
+    def test_warm_from_templates(self):
+        out = StringIO()
+        with override_settings(CALLER_WARM=[]):
+            call_command("caller_warm", stdout=out)
+        # example/templates/posts.html calls api:post-list
+        self.assertIn("api:post-list /api/posts", out.getvalue())
+
+    @override_settings(CALLER_CACHE_VIEWS={}, CALLER_WARM=[], TEMPLATES=[{
+        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "OPTIONS": {"loaders": [("django.template.loaders.locmem.Loader", {
+            "options.html": (
+                "{% load caller_tags %}"
+                "{% call 'api:post-detail' 1 'post-1' with full=1 as 'post' cache=60 fields='title' %}"
+                "{% call 'api:post-list' as 'posts' cache=60 method='HEAD' %}"
+            ),
+        })]},
+    }])
+    def test_warm_template_options(self):
+        out = StringIO()
+        call_command("caller_warm", "--host=example.com", stdout=out)
+        self.assertIn("api:post-detail /api/posts/1/post-1", out.getvalue())
+        self.assertIn("api:post-list skipped (HEAD calls are not cached)", out.getvalue())
+        # the key a render of the template looks up
+        request = RequestFactory(HTTP_HOST="example.com").get("/")
+        with translation.override(settings.LANGUAGE_CODE):
+            data = cache.get(cache.make_key(request, "/api/posts/1/post-1", "full=1&fields=title"))
+        self.assertEqual(data["data"], {"title": "post 1"})
+
+    def test_skip_not_cached_views(self):
+        out = StringIO()
+        with override_settings(CALLER_CACHE_VIEWS={}):
+            call_command("caller_warm", "--no-templates", stdout=out)
+        self.assertIn("api:post-list skipped", out.getvalue())
+
+    def test_save_timings(self):
+        fd, path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
+            call_command("caller_warm", "--no-templates", "--save-timings={}".format(path), stdout=StringIO())
+            with open(path) as fp:
+                timings = json.load(fp)
+        finally:
+            os.remove(path)
+        self.assertIn("api:post-list", timings)
+
+
+REPORT_TEMPLATES = {
+    "base.html": "{% load caller_tags %}{% call 'api:post-list' as 'posts' %}{% block content %}{% endblock %}",
+    "page.html": (
+        "{% extends 'base.html' %}{% load caller_tags %}"
+        "{% block content %}"
+        "{% call 'api:post-list' as 'posts' %}"
+        "{% for post in posts.data %}{% call 'api:post-detail' post.id post.slug as 'detail' %}{% endfor %}"
+        "{% include 'footer.html' %}"
+        "{% endblock %}"
+    ),
+    "footer.html": "{% load caller_tags %}{% call 'api:post-detail' 1 'post-1' with full=1 as 'post' %}",
+}
+
+
+@override_settings(TEMPLATES=[{
+    "BACKEND": "django.template.backends.django.DjangoTemplates",
+    "OPTIONS": {
+        "loaders": [("django.template.loaders.locmem.Loader", REPORT_TEMPLATES)],
+    },
+}])
+class TestReport(TransactionTestCase):
+    def report(self, *args):
+        out = StringIO()
+        call_command("caller_report", *args, stdout=out)
+        return out.getvalue()
+
+    def test_report(self):
+        output = self.report()
+        self.assertIn("'api:post-list'  [literal, duplicate]", output)
+        self.assertIn("'api:post-detail' post.id post.slug  [dynamic, in loop (N+1)]", output)
+        self.assertIn("'api:post-detail' 1 'post-1' with full=1  [literal, from footer.html]", output)
+
+    def test_rank_by_timings(self):
+        fd, path = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(fd, "w") as fp:
+            json.dump({"api:post-list": 10, "api:post-detail": 2}, fp)
+        try:
+            output = self.report("--timings={}".format(path))
+        finally:
+            os.remove(path)
+        lines = [line for line in output.splitlines() if not line.startswith(" ")]
+        self.assertEqual(lines, [
+            "page.html (cost: 42.0ms, 4 calls)",
+            "base.html (cost: 10.0ms, 1 calls)",
+            "footer.html (cost: 2.0ms, 1 calls)",
+        ])
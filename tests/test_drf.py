@@ -0,0 +1,78 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from unittest import skipIf
+
+import caller
+from caller.exceptions import ResponseTooLarge
+from caller.stats import get_stats
+from django.contrib.auth.models import User
+from django.test import RequestFactory, TestCase, override_settings
+from example.models import Post
+
+from .test_tags import POSTS
+
+try:
+    import rest_framework
+except ImportError:
+    rest_framework = None
+
+
+@skipIf(rest_framework is None, "djangorestframework is not installed")
+@override_settings(ROOT_URLCONF="tests.drf")
+class TestFastPath(TestCase):
+    def setUp(self):
+        self.posts = [Post.objects.create(**post) for post in POSTS]
+        self.request = RequestFactory().get("/")
+        self.request.user = User.objects.create_user("user")
+
+    def test_not_enabled(self):
+        data = caller.get("drf:whoami", request=self.request)
+        self.assertIn("throttled", data["detail"])
+
+    @override_settings(CALLER_DRF_FAST_PATH={"drf": True})
+    def test_fast_path(self):
+        with self.assertNumQueries(0):
+            data = caller.get("drf:whoami", request=self.request, params={"page": 2})
+        self.assertEqual(data, {"user": "user", "page": "2"})
+        data = caller.get("drf:post-list", request=self.request)
+        self.assertEqual([post["slug"] for post in data], ["post-1", "post-2", "post-3", "post 4"])
+        data = caller.get("drf:post-detail", request=self.request, kwargs={"pk": self.posts[1].pk})
+        self.assertEqual(data["title"], "post 2")
+        # not rest framework views
+        with override_settings(CALLER_DRF_FAST_PATH=True):
+            data = caller.get("api:post-list", request=self.request)
+        self.assertEqual(len(data["data"]), 4)
+
+    @override_settings(CALLER_DRF_FAST_PATH=True)
+    def test_fast_path_size_limits(self):
+        with override_settings(CALLER_MAX_RESPONSE_SIZE={"drf:post-list": 50}):
+            with self.assertRaises(ResponseTooLarge):
+                caller.get("drf:post-list", request=self.request)
+            data = caller.get("drf:post-detail", request=self.request, kwargs={"pk": self.posts[1].pk})
+        self.assertEqual(data["title"], "post 2")
+        calls = get_stats(self.request).calls
+        self.assertGreater(calls[0].bytes, 50)
+        # without a limit the size is not measured
+        self.assertIsNone(calls[1].bytes)
+        with override_settings(CALLER_MAX_REQUEST_SIZE=calls[0].bytes + 10):
+            with self.assertRaises(ResponseTooLarge):
+                caller.get("drf:post-detail", request=self.request, kwargs={"pk": self.posts[1].pk})
+        self.assertGreater(get_stats(self.request).bytes, calls[0].bytes)
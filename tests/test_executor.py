@@ -0,0 +1,101 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import threading
+import time
+
+from caller import executor
+from django.test import SimpleTestCase, override_settings
+from django.urls import get_script_prefix, get_urlconf, set_script_prefix, set_urlconf
+from django.utils import timezone, translation
+
+
+class Concurrency:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max = 0
+
+    def __call__(self):
+        with self.lock:
+            self.running += 1
+            self.max = max(self.max, self.running)
+        time.sleep(0.02)
+        with self.lock:
+            self.running -= 1
+
+
+class TestExecutor(SimpleTestCase):
+    def get_state(self):
+        return (
+            threading.get_ident(),
+            translation.get_language(),
+            timezone.get_current_timezone_name(),
+            get_urlconf(),
+            get_script_prefix(),
+        )
+
+    def test_thread_state(self):
+        set_urlconf("example.urls")
+        set_script_prefix("/prefix/")
+        try:
+            with translation.override("it"), timezone.override("Europe/Rome"):
+                state = executor.submit(self.get_state).result()
+        finally:
+            set_urlconf(None)
+            set_script_prefix("/")
+        self.assertNotEqual(state[0], threading.get_ident())
+        self.assertEqual(state[1:], ("it", "Europe/Rome", "example.urls", "/prefix/"))
+
+    @override_settings(CALLER_MAX_WORKERS=0)
+    def test_inline(self):
+        self.assertEqual(executor.submit(threading.get_ident).result(), threading.get_ident())
+        future = executor.submit(lambda: 1 / 0)
+        with self.assertRaises(ZeroDivisionError):
+            future.result()
+
+    def test_nested_submit_runs_inline(self):
+        def nested():
+            return threading.get_ident(), executor.submit(threading.get_ident).result()
+
+        outer, inner = executor.submit(nested).result()
+        self.assertEqual(outer, inner)
+
+    def test_view_limits(self):
+        concurrency = Concurrency()
+        futures = [executor.submit(concurrency, view="api:post-list") for i in range(4)]
+        [future.result() for future in futures]
+        self.assertGreater(concurrency.max, 1)
+
+        concurrency = Concurrency()
+        with override_settings(CALLER_VIEW_LIMITS={"api": 1}):
+            futures = [executor.submit(concurrency, view="api:post-list") for i in range(4)]
+            futures.extend(executor.submit(concurrency, view="api:post-detail") for i in range(4))
+            [future.result() for future in futures]
+        self.assertEqual(concurrency.max, 1)
+
+    @override_settings(CALLER_MAX_WORKERS=2, CALLER_VIEW_LIMITS={"slow": 1})
+    def test_view_limits_dont_take_workers(self):
+        start = time.perf_counter()
+        slow = [executor.submit(time.sleep, 0.2, view="slow") for i in range(3)]
+        fast = executor.submit(time.perf_counter, view="fast").result()
+        self.assertLess(fast - start, 0.1)
+        [future.result() for future in slow]
+        self.assertGreaterEqual(time.perf_counter() - start, 0.6)
@@ -0,0 +1,131 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import copy
+import json
+import pickle
+from unittest import mock
+
+import caller
+from caller import cache
+from caller.cache import MemoryCache, memory
+from caller.exceptions import FrozenResultError
+from caller.frozen import FrozenDict, FrozenList, freeze, thaw
+from django.core.cache import caches
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from example.models import Post
+
+from .test_tags import POSTS
+
+
+class TestFrozen(SimpleTestCase):
+    def test_freeze(self):
+        value, size = freeze({"data": [{"id": 1, "tags": ["a"]}], "count": 1})
+        self.assertIsInstance(value, FrozenDict)
+        self.assertIsInstance(value["data"], FrozenList)
+        self.assertIsInstance(value["data"][0]["tags"], FrozenList)
+        self.assertEqual(value, {"data": [{"id": 1, "tags": ["a"]}], "count": 1})
+        self.assertGreater(size, 0)
+        self.assertEqual(json.loads(json.dumps(value)), value)
+        for change in [
+            lambda: value.update(count=2),
+            lambda: value.pop("count"),
+            lambda: value.__setitem__("count", 2),
+            lambda: value["data"].append(1),
+            lambda: value["data"][0]["tags"].sort(),
+        ]:
+            with self.assertRaisesMessage(FrozenResultError, "caller.frozen.thaw()"):
+                change()
+        self.assertEqual(value["count"], 1)
+
+    def test_copies(self):
+        value, size = freeze({"data": [1, 2]})
+        self.assertIs(copy.deepcopy(value), value)
+        self.assertIsInstance(pickle.loads(pickle.dumps(value))["data"], FrozenList)
+        mutable = thaw(value)
+        mutable["data"].append(3)
+        self.assertEqual(type(mutable["data"]), list)
+        self.assertEqual(value["data"], [1, 2])
+
+    @override_settings(CALLER_MEMORY_CACHE_SIZE=2000)
+    def test_memory_cache(self):
+        cache = MemoryCache()
+        value = cache.set("a", {"text": "x" * 600}, 60)
+        self.assertIs(cache.get("a"), value)
+        cache.set("b", {"text": "x" * 600}, 60)
+        cache.get("a")
+        cache.set("c", {"text": "x" * 600}, 60)
+        self.assertEqual([key for key in "abc" if cache.get(key) is not None], ["a", "c"])
+        self.assertLessEqual(cache.size, 2000)
+        cache.set("expired", {}, -1)
+        self.assertIsNone(cache.get("expired"))
+        # too big to be stored, but frozen anyway
+        self.assertIsInstance(cache.set("big", {"text": "x" * 3000}, 60), FrozenDict)
+        self.assertIsNone(cache.get("big"))
+
+
+@override_settings(CALLER_MEMORY_CACHE_SIZE=1024 * 1024)
+class TestMemoryCache(TestCase):
+    def setUp(self):
+        self.posts = [Post.objects.create(**post) for post in POSTS]
+        self.request = RequestFactory().get("/")
+
+    def tearDown(self):
+        caches["default"].clear()
+        memory.clear()
+
+    def test_shared(self):
+        data = caller.get("api:post-list", request=self.request, timeout=60)
+        self.assertIsInstance(data, FrozenDict)
+        self.assertIs(caller.get("api:post-list", request=self.request, timeout=60), data)
+        with self.assertRaises(FrozenResultError):
+            data["data"].pop()
+        # filled from the CALLER_CACHE cache
+        memory.clear()
+        other = caller.get("api:post-list", request=self.request, timeout=60)
+        self.assertIsInstance(other, FrozenDict)
+        self.assertEqual(other, data)
+        # not cached calls are not frozen
+        self.assertNotIsInstance(caller.get("api:post-list", request=self.request), FrozenDict)
+
+    def test_remaining_timeout(self):
+        key = "caller:test"
+        with mock.patch("caller.cache.time.time", return_value=1000.0):
+            cache.set(key, {"data": 1}, 60)
+        memory.clear()
+        # promoted 50 seconds later, it expires in memory after the 10 seconds left
+        with mock.patch("caller.cache.time.time", return_value=1050.0):
+            with mock.patch("caller.cache.memory.set", wraps=memory.set) as memory_set:
+                self.assertEqual(cache.get(key, 60), {"data": 1})
+        self.assertEqual(memory_set.call_args[0][2], 10.0)
+        memory.clear()
+        with mock.patch("caller.cache.time.time", return_value=1061.0):
+            self.assertIsNone(cache.get(key, 60))
+
+    def test_template(self):
+        template = Template(
+            "{% load caller_tags %}{% call 'api:post-list' as 'posts' cache=60 %}"
+            "{% for post in posts.data|dictsort:'slug' %}{{ post.slug }},{% endfor %}"
+            "{{ posts|json_script:'posts-data' }}"
+        )
+        for i in range(2):
+            output = template.render(Context({"request": self.request}))
+            self.assertTrue(output.startswith("post 4,post-1,post-2,post-3,"))
@@ -0,0 +1,79 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from unittest import mock, skipIf
+
+from caller import Call
+from caller.utils import call
+from django.test import TestCase, override_settings
+from example.models import Post
+
+from .test_tags import POSTS
+
+try:
+    import jinja2
+    from caller.jinja2 import CallExtension
+except ImportError:
+    jinja2 = None
+
+
+@skipIf(jinja2 is None, "jinja2 is not installed")
+class TestJinja2(TestCase):
+    def setUp(self):
+        self.posts = [Post.objects.create(**post) for post in POSTS]
+        self.env = jinja2.Environment(extensions=[CallExtension])
+        self.request = self.client.get("/").wsgi_request
+
+    def render(self, source, **context):
+        return self.env.from_string(source).render(request=self.request, **context)
+
+    def test_tag(self):
+        output = self.render("{% callview 'api:post-list' with amount=2 as posts %}{{ posts.data|length }}")
+        self.assertEqual(output, "4")
+        source = "{% callview 'api:post-detail', 4, slug with full=1 as post %}{{ post.url }}"
+        output = self.render(source, slug="post 4")
+        self.assertEqual(output, "http://testserver/api/posts/4/post%204?full=1")
+        output = self.render("{% callview 'api:post-detail' id=1, slug='post-1' as post %}{{ post.data.slug }}")
+        self.assertEqual(output, "post-1")
+        with self.assertRaises(jinja2.TemplateSyntaxError):
+            self.env.from_string("{% callview 'api:post-detail' id=1, 'post-1' as post %}")
+        with self.assertRaises(jinja2.TemplateSyntaxError):
+            self.env.from_string("{% callview 'api:post-list' as posts eager %}")
+
+    @override_settings(CALLER_MAX_WORKERS=0)
+    def test_options(self):
+        with mock.patch("caller.client.call", wraps=call) as mocked:
+            output = self.render("{% callview 'api:post-detail', 1, 'post-1' as post lazy cache=60 %}{{ post.data.slug }}")  # noqa: E501
+            self.assertEqual(output, "post-1")
+            self.assertEqual(mocked.call_args[1]["timeout"], 60)
+        with self.assertLogs("caller", "WARNING"):
+            output = self.render("{% callview 'api:raise-exception' as value default='failed' %}{{ value }}")
+        self.assertEqual(output, "failed")
+
+    def test_globals(self):
+        output = self.render("{{ call_view('api:post-list', params={'amount': 3}).url }}")
+        self.assertEqual(output, "http://testserver/api/posts?amount=3")
+        with override_settings(CALLER_BATCH_VIEWS={"api:post-detail": "api:post-batch"}):
+            with mock.patch("caller.client.call", wraps=call) as mocked:
+                calls = [Call("api:post-detail", args=[post["id"], post["slug"]]) for post in POSTS]
+                source = "{% for post in call_many(calls) %}{{ post.data.slug }},{% endfor %}"
+                output = self.render(source, calls=calls)
+            self.assertEqual(output, "post-1,post-2,post-3,post 4,")
+            self.assertEqual(mocked.call_count, 1)
@@ -0,0 +1,85 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import json
+import os
+import shutil
+import tempfile
+
+from caller.exceptions import SnapshotMissing
+from caller.utils import call
+from django.template import Context
+from django.test import RequestFactory, TestCase, override_settings
+from example.models import Post
+
+from .test_tags import POSTS
+from .utils import setup, snapshot
+
+
+def create_posts():
+    for post in POSTS:
+        Post.objects.create(**post)
+
+
+class TestSnapshot(TestCase):
+    libraries = {'caller_tags': 'caller.templatetags.caller_tags'}
+
+    def setUp(self):
+        self.request = RequestFactory().get("/")
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "calls.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_record(self):
+        create_posts()
+        with override_settings(CALLER_SNAPSHOT_MODE="record", CALLER_SNAPSHOT_PATH=self.path):
+            data = call(self.request, "/api/posts/1/post-1", {"full": 1}, view="api:post-detail")
+            missing = call(self.request, "/api/posts/9/post-9", view="api:post-detail")
+            # recording the same result again doesn't add a line
+            call(self.request, "/api/posts/1/post-1", {"full": 1}, view="api:post-detail")
+        with open(self.path) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([(line["url"], line["qs"], line["status"]) for line in lines], [
+            ("/api/posts/1/post-1", "full=1", 200),
+            ("/api/posts/9/post-9", "", 404),
+        ])
+        self.assertEqual(lines[0]["data"], data)
+        self.assertEqual(lines[1]["data"], missing)
+
+        Post.objects.all().delete()
+        with override_settings(CALLER_SNAPSHOT_MODE="replay", CALLER_SNAPSHOT_PATH=self.path):
+            replayed = call(self.request, "/api/posts/1/post-1", {"full": 1}, view="api:post-detail")
+            self.assertEqual(replayed, data)
+            # changing a replayed result doesn't change the next replays
+            replayed["data"]["title"] = "changed"
+            self.assertEqual(call(self.request, "/api/posts/1/post-1", {"full": 1}, view="api:post-detail"), data)
+            with self.assertRaises(SnapshotMissing):
+                call(self.request, "/api/posts/1/post-1", view="api:post-detail")
+
+    @snapshot("posts", fixtures=create_posts)
+    @setup({
+        "posts": "{% load caller_tags %}{% call 'api:post-list' as 'posts' %}{% for post in posts.data %}{{ post.slug }},{% endfor %}{% call 'api:post-detail' 4 'post 4' as 'post' %}{{ post.data.title }}",  # noqa: E501
+    })
+    def test_replay(self):
+        # no posts in the database: the payloads are replayed from tests/snapshots/posts.jsonl
+        output = self.engine.get_template("posts").render(Context({"request": self.request}))
+        self.assertEqual(output, "post-1,post-2,post-3,post 4,post 4")
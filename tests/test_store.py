@@ -0,0 +1,129 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from caller.store import SharedMemoryCache
+from caller.utils import call
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, TestCase, override_settings
+from example.models import Post
+
+from .test_tags import POSTS
+
+
+def set_in_child(location):
+    SharedMemoryCache(location, {}).set("key", {"from": os.getpid()})
+
+
+class TestSharedMemoryCache(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, "cache.sqlite3")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get_cache(self, **options):
+        return SharedMemoryCache(self.location, {"OPTIONS": options})
+
+    def test_location(self):
+        with self.assertRaises(ImproperlyConfigured):
+            SharedMemoryCache("", {})
+        self.get_cache().set("key", 1)
+        self.assertEqual(os.stat(self.location).st_mode & 0o777, 0o600)
+
+    def test_insecure_location(self):
+        os.close(os.open(self.location, os.O_CREAT | os.O_RDWR, 0o666))
+        os.chmod(self.location, 0o666)
+        self.get_cache().set("key", 1)
+        self.assertEqual(os.stat(self.location).st_mode & 0o777, 0o600)
+        link = os.path.join(self.directory, "link.sqlite3")
+        os.symlink(self.location, link)
+        with self.assertRaises(OSError):
+            SharedMemoryCache(link, {}).get("key")
+
+    def test_cache(self):
+        cache = self.get_cache()
+        self.assertIsNone(cache.get("key"))
+        cache.set("key", {"data": [1, 2]})
+        self.assertEqual(cache.get("key"), {"data": [1, 2]})
+        self.assertFalse(cache.add("key", "other"))
+        self.assertTrue(cache.add("other", "other"))
+        self.assertTrue(cache.has_key("other"))
+        self.assertTrue(cache.delete("other"))
+        self.assertFalse(cache.has_key("other"))
+        cache.set("expired", 1, timeout=0)
+        self.assertIsNone(cache.get("expired"))
+        self.assertTrue(cache.add("expired", 2))
+        self.assertEqual(cache.get("expired"), 2)
+        cache.clear()
+        self.assertIsNone(cache.get("key"))
+
+    def test_lru(self):
+        cache = self.get_cache(MAX_SIZE=1000)
+        cache.touch_interval = 0
+        for key in "abc":
+            cache.set(key, "x" * 300)
+            time.sleep(0.01)
+        # a is the most recently used now
+        cache.get("a")
+        cache.set("d", "x" * 300)
+        self.assertEqual([key for key in "abcd" if cache.has_key(key)], ["a", "c", "d"])
+        cache.set("e", "x" * 2000)
+        self.assertFalse(cache.has_key("e"))
+
+    def test_max_entries(self):
+        cache = self.get_cache(MAX_ENTRIES=2)
+        for key in "abc":
+            cache.set(key, key)
+        self.assertEqual([key for key in "abc" if cache.has_key(key)], ["b", "c"])
+
+    def test_processes(self):
+        cache = self.get_cache()
+        cache.get("key")
+        process = multiprocessing.get_context("fork").Process(target=set_in_child, args=(self.location,))
+        process.start()
+        process.join()
+        self.assertEqual(cache.get("key"), {"from": process.pid})
+
+
+class TestCallerCache(TestCase):
+    def setUp(self):
+        self.posts = [Post.objects.create(**post) for post in POSTS]
+        self.request = self.client.get("/").wsgi_request
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_caller_cache(self):
+        location = os.path.join(self.directory, "cache.sqlite3")
+        backend = {"BACKEND": "caller.store.SharedMemoryCache", "LOCATION": location}
+        with override_settings(CACHES={"default": backend}):
+            data = call(self.request, "/api/posts", view="api:post-list", timeout=60)
+            Post.objects.all().delete()
+            self.assertEqual(call(self.request, "/api/posts", view="api:post-list", timeout=60), data)
+            self.assertEqual(len(caches["default"].get_connection().execute("SELECT * FROM entries").fetchall()), 1)
@@ -0,0 +1,75 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from caller.streaming import render_to_stream
+from django.template import loader
+from django.test import RequestFactory, TransactionTestCase, override_settings
+from example.models import Post
+
+from .test_tags import POSTS
+
+TEMPLATES = {
+    "page.html": (
+        "{% load caller_tags %}<h1>{{ title }}</h1>"
+        "{% deferred %}{% call 'api:post-detail' 1 'post-1' as 'post' %}<p>{{ post.data.title }}</p>"
+        "{% placeholder %}loading{% enddeferred %}"
+        "{% deferred %}{% call 'api:post-detail' 2 'post-2' as 'post' %}<p>{{ post.data.title }}</p>{% enddeferred %}"
+        "<footer></footer>"
+    ),
+    "error.html": (
+        "{% load caller_tags %}"
+        "{% deferred %}{% call 'api:raise-exception' as 'value' %}{% enddeferred %}<footer></footer>"
+    ),
+}
+
+
+@override_settings(TEMPLATES=[{
+    "BACKEND": "django.template.backends.django.DjangoTemplates",
+    "OPTIONS": {
+        "loaders": [("django.template.loaders.locmem.Loader", TEMPLATES)],
+        "context_processors": ["django.template.context_processors.request"],
+    },
+}])
+class TestDeferred(TransactionTestCase):
+    def setUp(self):
+        self.posts = [Post.objects.create(**post) for post in POSTS]
+        self.request = RequestFactory().get("/")
+
+    def test_not_streamed(self):
+        output = loader.render_to_string("page.html", {"title": "posts"}, self.request)
+        self.assertEqual(output, "<h1>posts</h1><p>post 1</p><p>post 2</p><footer></footer>")
+
+    def test_streamed(self):
+        response = render_to_stream(self.request, "page.html", {"title": "posts"})
+        shell, *fills = [chunk.decode() for chunk in response.streaming_content]
+        self.assertEqual(shell, (
+            '<h1>posts</h1><div id="caller-deferred-1" class="caller-deferred">loading</div>'
+            '<div id="caller-deferred-2" class="caller-deferred"></div><footer></footer>'
+        ))
+        self.assertEqual(len(fills), 2)
+        for fill in fills:
+            self.assertRegex(fill, r'^<template id="caller-deferred-(\d)-content"><p>post \1</p></template><script>')
+
+    @override_settings(CALLER_MAX_WORKERS=0)
+    def test_error(self):
+        response = render_to_stream(self.request, "error.html")
+        with self.assertLogs("caller", "ERROR"):
+            shell, fill = [chunk.decode() for chunk in response.streaming_content]
+        self.assertIn('<template id="caller-deferred-1-content"></template>', fill)
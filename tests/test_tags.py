@@ -19,9 +19,22 @@
 # THE SOFTWARE.
 
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from urllib.parse import quote
 
+from caller.exceptions import CallInLoopWarning
+from caller.stats import enable_hydration, get_stats
+from caller.templatetags.caller_tags import CallNode
+from caller.utils import call
+from django.db import connections
+from django.template import Context
+from django.template.engine import Engine
 from django.template.exceptions import TemplateSyntaxError
-from django.test import TestCase
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import translation
+from django.utils.translation import gettext_lazy
 from example.models import Post
 
 from .utils import setup
@@ -116,3 +129,241 @@ class TestTag(TestCase):
             self.engine.render_to_string("post-1", {"request": request})
         with self.assertRaises(ZeroDivisionError):
             self.engine.render_to_string("raise-exception", {"request": request})
+
+    @setup({
+        "loop": "{% load caller_tags %}{% for post in posts %}{% call 'api:post-detail' post.id post.slug as 'detail' %}{{ detail.data.slug }},{% endfor %}",  # noqa: E501
+        "loop-kwargs": "{% load caller_tags %}{% for id, slug in posts %}{% call 'api:post-detail' id=id slug=slug as 'detail' %}{{ detail.data.slug }},{% endfor %}",  # noqa: E501
+    })
+    def test_loop_batch(self):
+        request = self.client.get("/").wsgi_request
+        posts = [{"id": post["id"], "slug": post["slug"]} for post in POSTS]
+        with mock.patch("caller.client.call", wraps=call) as mocked:
+            with override_settings(CALLER_BATCH_VIEWS={"api:post-detail": "api:post-batch"}):
+                output = self.engine.render_to_string("loop", {"request": request, "posts": posts})
+            self.assertEqual(output, "post-1,post-2,post-3,post 4,")
+            self.assertEqual(mocked.call_count, 1)
+
+            posts = [(post["id"], post["slug"]) for post in POSTS]
+            batch = {"api:post-detail": {"view": "api:post-batch", "arg": "id"}}
+            with override_settings(CALLER_BATCH_VIEWS=batch):
+                output = self.engine.render_to_string("loop-kwargs", {"request": request, "posts": posts})
+            self.assertEqual(output, "post-1,post-2,post-3,post 4,")
+            self.assertEqual(mocked.call_count, 2)
+
+    @setup({
+        "loop": "{% load caller_tags %}{% for post in posts %}{% call 'api:post-detail' post.id post.slug as 'detail' %}{{ detail.data.slug }},{% endfor %}",  # noqa: E501
+    })
+    def test_loop_without_batch(self):
+        request = self.client.get("/").wsgi_request
+        posts = [{"id": post["id"], "slug": post["slug"]} for post in POSTS]
+        with mock.patch("caller.client.call", wraps=call) as mocked:
+            with override_settings(DEBUG=True), self.assertWarns(CallInLoopWarning):
+                output = self.engine.render_to_string("loop", {"request": request, "posts": posts})
+        self.assertEqual(output, "post-1,post-2,post-3,post 4,")
+        self.assertEqual(mocked.call_count, 4)
+
+    @setup({
+        "batch": "{% load caller_tags %}{% call 'api:post-batch' with full=1 page='a b' id=ids id=3 as 'posts' %}{{ posts|json_script:'posts-data' }}",  # noqa: E501
+    })
+    def test_params(self):
+        node = self.engine.get_template("batch").nodelist[-2]
+        self.assertEqual(node.query[0], "full=1&page=a+b")
+        self.assertEqual(node.query[2], "id=3")
+        request = self.client.get("/").wsgi_request
+        output = self.engine.render_to_string("batch", {"request": request, "ids": [1, 2]})
+        data = self.loads(output, "posts-data")
+        self.assertEqual(sorted(data), ["1", "2", "3"])
+
+    @setup({
+        "translated": "{% load caller_tags %}{% call 'api:post-detail' 1 'post-1' with q=_('Yes') v=value as 'post' %}{{ post.url }}",  # noqa: E501
+    })
+    def test_translated_params(self):
+        request = self.client.get("/").wsgi_request
+        with translation.override("it"):
+            self.engine.get_template("translated")
+        with translation.override("en"):
+            output = self.engine.render_to_string("translated", {"request": request, "value": gettext_lazy("Yes")})
+        self.assertEqual(output, "http://testserver/api/posts/1/post-1?q=Yes&amp;v=Yes")
+        with translation.override("it"):
+            output = self.engine.render_to_string("translated", {"request": request, "value": 4})
+        self.assertEqual(output, "http://testserver/api/posts/1/post-1?q=S%C3%AC&amp;v=4")
+
+    @setup({
+        "equals": "{% load caller_tags %}{% call 'api:post-detail' 1 'post-1' with q='a=b' as 'post' %}{{ post.url }}",  # noqa: E501
+        "unknown": "{% load caller_tags %}{% call 'api:post-list' as 'posts' eager %}",
+        "post-method": "{% load caller_tags %}{% call 'api:post-list' as 'posts' method='post' %}",
+    })
+    def test_parse(self):
+        request = self.client.get("/").wsgi_request
+        output = self.engine.render_to_string("equals", {"request": request})
+        self.assertEqual(output, "http://testserver/api/posts/1/post-1?q=a%3Db")
+        for name in ["unknown", "post-method"]:
+            with self.assertRaises(TemplateSyntaxError):
+                self.engine.render_to_string(name, {"request": request})
+
+    @setup({
+        "lazy": "{% load caller_tags %}{% call 'api:post-detail' 1 'post-1' as 'post' lazy cache=60 %}{{ post.data.slug }}",  # noqa: E501
+        "default": "{% load caller_tags %}{% call 'api:raise-exception' as 'value' default='failed' %}{{ value }}",  # noqa: E501
+        "timeout": "{% load caller_tags %}{% call 'api:raise-exception' as 'value' timeout=1 default=fallback %}{{ value }}",  # noqa: E501
+        "head": "{% load caller_tags %}{% call 'api:post-list' as 'posts' method='HEAD' %}{{ posts.data|length }}",  # noqa: E501
+    })
+    @override_settings(CALLER_MAX_WORKERS=0)
+    def test_options(self):
+        request = self.client.get("/").wsgi_request
+        with mock.patch("caller.client.call", wraps=call) as mocked:
+            output = self.engine.render_to_string("lazy", {"request": request})
+            self.assertEqual(output, "post-1")
+            self.assertEqual(mocked.call_args[1]["timeout"], 60)
+        with self.assertLogs("caller", "WARNING"):
+            output = self.engine.render_to_string("default", {"request": request})
+        self.assertEqual(output, "failed")
+        with self.assertLogs("caller", "WARNING"):
+            output = self.engine.render_to_string("timeout", {"request": request, "fallback": "late"})
+        self.assertEqual(output, "late")
+        output = self.engine.render_to_string("head", {"request": request})
+        self.assertEqual(output, "4")
+
+    @setup({
+        "missing": "{% load caller_tags %}{% call 'api:post-missing' as 'post' %}",
+        "namespace": "{% load caller_tags %}{% call 'missing:post-list' as 'posts' %}",
+        "arity": "{% load caller_tags %}{% call 'api:post-detail' 1 as 'post' %}",
+        "kwargs": "{% load caller_tags %}{% call 'api:post-detail' id=1 slug=slug as 'post' %}{{ post.data.slug }}",  # noqa: E501
+    })
+    def test_validate_views(self):
+        request = self.client.get("/").wsgi_request
+        with override_settings(CALLER_VALIDATE_VIEWS=True):
+            for name in ["missing", "namespace", "arity"]:
+                with self.assertRaises(TemplateSyntaxError):
+                    self.engine.get_template(name)
+            output = self.engine.render_to_string("kwargs", {"request": request, "slug": "post-1"})
+            self.assertEqual(output, "post-1")
+
+    @setup({
+        "paginate": "{% load caller_tags %}{% call 'api:post-list' with page_size=1 as 'posts' paginate %}{% for post in posts %}{{ post.slug }},{% endfor %}",  # noqa: E501
+        "limit": "{% load caller_tags %}{% call 'api:post-list' with page_size=2 as 'posts' paginate=3 %}{{ posts|length }}:{% for post in posts|slice:':1' %}{{ post.slug }}{% endfor %}",  # noqa: E501
+    })
+    def test_paginate(self):
+        request = self.client.get("/").wsgi_request
+        with mock.patch("caller.client.call", wraps=call) as mocked:
+            output = self.engine.render_to_string("paginate", {"request": request})
+        self.assertEqual(output, "post-1,post-2,post-3,post 4,")
+        self.assertEqual(mocked.call_count, 4)
+        self.assertEqual(mocked.call_args[1]["qs"], "page_size=1&page=4")
+        with mock.patch("caller.client.call", wraps=call) as mocked:
+            output = self.engine.render_to_string("limit", {"request": request})
+        self.assertEqual(output, "3:post-1")
+        self.assertEqual(mocked.call_count, 1)
+
+    @setup({
+        "fields": "{% load caller_tags %}{% call 'api:post-detail' 1 'post-1' as 'post' fields='title' %}{{ post.data|length }}{{ post.data.title }}",  # noqa: E501
+        "loop": "{% load caller_tags %}{% for post in posts %}{% call 'api:post-detail' post.id post.slug as 'detail' fields='slug' %}{{ detail.data|length }}{{ detail.data.slug }},{% endfor %}",  # noqa: E501
+    })
+    @override_settings(CALLER_MAX_WORKERS=0)
+    def test_fields(self):
+        request = self.client.get("/").wsgi_request
+        output = self.engine.render_to_string("fields", {"request": request})
+        self.assertEqual(output, "1post 1")
+        posts = [{"id": post["id"], "slug": post["slug"]} for post in POSTS[:2]]
+        for settings in [{}, {"CALLER_PREFETCH_LOOPS": True}, {"CALLER_BATCH_VIEWS": {"api:post-detail": "api:post-batch"}}]:  # noqa: E501
+            with override_settings(**settings), mock.patch("caller.client.call", wraps=call) as mocked:
+                output = self.engine.render_to_string("loop", {"request": request, "posts": posts})
+            self.assertEqual(output, "1post-1,1post-2,")
+            # the views get the fields param
+            for args, kwargs in mocked.call_args_list:
+                self.assertTrue(kwargs["fields"] == ["slug"] or kwargs["qs"].endswith("fields=slug"))
+            self.assertEqual(mocked.call_count, 1 if settings.get("CALLER_BATCH_VIEWS") else 2)
+
+    @setup({
+        "hydration": "{% load caller_tags %}{% call 'api:post-detail' 4 'post 4' with full=1 as 'post' %}{% call 'api:post-list' as 'posts' %}{% call 'api:post-detail' 9 'post-9' as 'missing' %}{% caller_hydration %}",  # noqa: E501
+    })
+    def test_hydration(self):
+        # the payloads are not kept unless asked
+        request = self.client.get("/").wsgi_request
+        output = self.engine.render_to_string("hydration", {"request": request})
+        self.assertEqual(self.loads(output, "caller-hydration"), {})
+        self.assertEqual([stats.data for stats in get_stats(request).calls], [None, None, None])
+
+        request = self.client.get("/").wsgi_request
+        enable_hydration(request)
+        output = self.engine.render_to_string("hydration", {"request": request})
+        data = self.loads(output, "caller-hydration")
+        self.assertEqual(list(data), ["/api/posts/4/post%204?full=1", "/api/posts"])
+        self.assertEqual(data["/api/posts/4/post%204?full=1"]["data"]["slug"], "post 4")
+        self.assertEqual(len(data["/api/posts"]["data"]), 4)
+        # error payloads are not served as successful responses
+        self.assertEqual([stats.status for stats in get_stats(request).calls], [200, 200, 404])
+        self.assertNotIn("/api/posts/9/post-9", data)
+
+
+class TestThreadSafety(TransactionTestCase):
+    def setUp(self):
+        self.posts = [Post.objects.create(**post) for post in POSTS]
+        self.engine = Engine(
+            libraries={'caller_tags': 'caller.templatetags.caller_tags'},
+            loaders=[('django.template.loaders.cached.Loader', [
+                ('django.template.loaders.locmem.Loader', {
+                    "post": "{% load caller_tags %}{% call 'api:post-detail' id slug with n=n as 'post' %}{{ post.data.slug }}:{{ post.url }}",  # noqa: E501
+                }),
+            ])],
+        )
+
+    def render(self, n):
+        try:
+            template = self.engine.get_template("post")
+            post = POSTS[n % len(POSTS)]
+            request = RequestFactory().get("/")
+            output = template.render(Context({"request": request, "id": post["id"], "slug": post["slug"], "n": n}))
+            url = "http://testserver/api/posts/{}/{}?n={}".format(post["id"], quote(post["slug"]), n)
+            return output, "{}:{}".format(post["slug"], url)
+        finally:
+            connections.close_all()
+
+    def test_concurrent_render(self):
+        template = self.engine.get_template("post")
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(executor.map(self.render, range(400)))
+        for output, expected in results:
+            self.assertEqual(output, expected)
+        # the same compiled template has been used by every thread, and it keeps no render state
+        self.assertIs(self.engine.get_template("post"), template)
+        for node in template.nodelist.get_nodes_by_type(CallNode):
+            self.assertFalse(hasattr(node, "context"))
+
+    @override_settings(CALLER_PREFETCH_LOOPS=True)
+    def test_prefetch_loop(self):
+        template = Engine(
+            libraries={'caller_tags': 'caller.templatetags.caller_tags'},
+            loaders=[('django.template.loaders.locmem.Loader', {
+                "loop": "{% load caller_tags %}{% for post in posts %}{% call 'api:post-detail' post.id post.slug as 'detail' %}{{ detail.data.slug }},{% endfor %}",  # noqa: E501
+            })],
+        ).get_template("loop")
+        posts = [{"id": post["id"], "slug": post["slug"]} for post in POSTS]
+        threads = set()
+
+        def call_in_thread(*args, **kwargs):
+            threads.add(threading.get_ident())
+            return call(*args, **kwargs)
+
+        with mock.patch("caller.client.call", side_effect=call_in_thread) as mocked:
+            output = template.render(Context({"request": RequestFactory().get("/"), "posts": posts}))
+        self.assertEqual(output, "post-1,post-2,post-3,post 4,")
+        self.assertEqual(mocked.call_count, 4)
+        self.assertNotIn(threading.get_ident(), threads)
+
+    @override_settings(CALLER_PREFETCH_LOOPS=True)
+    def test_prefetch_loop_views(self):
+        template = Engine(
+            libraries={'caller_tags': 'caller.templatetags.caller_tags'},
+            loaders=[('django.template.loaders.locmem.Loader', {
+                "loop": "{% load caller_tags %}{% for v, id, slug in items %}{% call v id slug as 'd' %}{{ d }},{% endfor %}",  # noqa: E501
+            })],
+        ).get_template("loop")
+        items = [("api:post-detail", 1, "post-1"), ("api:post-detail", 2, "post-2"), ("blog:post-detail", 1, "post-1")]
+
+        def call_view(*args, view=None, with_status=False, **kwargs):
+            return (view, 200) if with_status else view
+
+        with mock.patch("caller.client.call", side_effect=call_view) as mocked:
+            output = template.render(Context({"request": RequestFactory().get("/"), "items": items}))
+        self.assertEqual(output, "api:post-detail,api:post-detail,blog:post-detail,")
+        self.assertEqual(mocked.call_count, 3)
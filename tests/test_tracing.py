@@ -0,0 +1,89 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from unittest import skipIf
+
+from caller.tracing import TRACEPARENT_KEY, InMemoryTracer, get_tracer
+from caller.utils import call
+from django.test import TestCase, override_settings
+from example.models import Post
+
+from . import middleware
+from .test_tags import POSTS
+
+try:
+    from opentelemetry import trace
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+except ImportError:
+    trace = None
+
+
+@override_settings(CALLER_MIDDLEWARE=["tests.middleware.RecordMiddleware"])
+class TestTracing(TestCase):
+    def setUp(self):
+        self.posts = [Post.objects.create(**post) for post in POSTS]
+        self.request = self.client.get("/").wsgi_request
+        del middleware.calls[:]
+
+    def test_disabled(self):
+        self.assertIsNone(get_tracer())
+        call(self.request, "/api/posts/1/post-1", view="api:post-detail")
+        self.assertNotIn(TRACEPARENT_KEY, middleware.calls[0].environ)
+
+    @override_settings(CALLER_TRACER="caller.tracing.InMemoryTracer")
+    def test_in_memory(self):
+        tracer = get_tracer()
+        self.assertIsInstance(tracer, InMemoryTracer)
+        self.assertIs(get_tracer(), tracer)
+
+        self.request.environ[TRACEPARENT_KEY] = "00-{}-{}-01".format("1" * 32, "2" * 16)
+        call(self.request, "/api/posts/1/post-1", {"full": 1}, view="api:post-detail")
+        with self.assertRaises(ZeroDivisionError):
+            call(self.request, "/api/raise-exception", view="api:raise-exception")
+
+        span, failed = tracer.spans
+        self.assertEqual(span.name, "api:post-detail")
+        self.assertEqual((span.trace_id, span.parent_id), ("1" * 32, "2" * 16))
+        self.assertEqual(span.attributes["http.url"], "/api/posts/1/post-1?full=1")
+        self.assertEqual(span.attributes["http.status_code"], 200)
+        self.assertGreater(span.attributes["http.response_content_length"], 0)
+        self.assertIn("caller.decode_time", span.attributes)
+        self.assertEqual(middleware.calls[0].environ[TRACEPARENT_KEY], span.traceparent)
+        self.assertIsInstance(failed.exception, ZeroDivisionError)
+
+    @skipIf(trace is None, "opentelemetry-sdk is not installed")
+    @override_settings(CALLER_TRACER="caller.tracing.OpenTelemetryTracer")
+    def test_opentelemetry(self):
+        exporter = InMemorySpanExporter()
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(exporter))
+        trace.set_tracer_provider(provider)
+
+        with trace.get_tracer("tests").start_as_current_span("render") as parent:
+            call(self.request, "/api/posts/1/post-1", view="api:post-detail")
+
+        span, render = exporter.get_finished_spans()
+        self.assertEqual(span.name, "api:post-detail")
+        self.assertEqual(span.parent.span_id, parent.get_span_context().span_id)
+        self.assertEqual(span.attributes["http.status_code"], 200)
+        traceparent = middleware.calls[0].environ[TRACEPARENT_KEY]
+        self.assertIn("{:016x}".format(span.context.span_id), traceparent)
@@ -0,0 +1,273 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from caller.exceptions import QueryBudgetExceeded, ResponseTooLarge
+from caller.middleware import StatsMiddleware
+from caller.singleflight import flights
+from caller.stats import DEPTH_KEY, get_stats
+from caller.utils import CallHandler, call, get_app, get_flight_key, get_middleware
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signals
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from example.models import Post
+
+from . import middleware
+from .test_tags import POSTS
+
+
+class TestCall(TestCase):
+    def setUp(self):
+        self.posts = [Post.objects.create(**post) for post in POSTS]
+        self.request = self.client.get("/").wsgi_request
+
+    def test_stats(self):
+        call(self.request, "/api/posts", view="api:post-list")
+        call(self.request, "/api/posts/1/post-1", {"full": "1"}, view="api:post-detail")
+        stats = get_stats(self.request)
+        self.assertEqual([(s.view, s.url, s.qs) for s in stats.calls], [
+            ("api:post-list", "/api/posts", ""),
+            ("api:post-detail", "/api/posts/1/post-1", "full=1"),
+        ])
+        self.assertIsNone(stats.calls[0].queries)
+        self.assertGreater(stats.duration, 0)
+        self.assertGreater(stats.calls[0].bytes, 0)
+        self.assertEqual(stats.bytes, stats.calls[0].bytes + stats.calls[1].bytes)
+        self.assertIsNone(stats.calls[0].data)
+
+    @override_settings(CALLER_HYDRATION=True)
+    def test_stats_data(self):
+        # only the payloads of top level calls are kept
+        request = RequestFactory().get("/")
+        data = call(request, "/api/posts/1/post-1", view="api:post-detail")
+        request.environ[DEPTH_KEY] = 1
+        call(request, "/api/posts/2/post-2", view="api:post-detail")
+        self.assertEqual([stats.data for stats in get_stats(request).calls], [data, None])
+
+    def test_response_size(self):
+        size = len(json.dumps(call(self.request, "/api/posts", view="api:post-list")))
+        with override_settings(CALLER_MAX_RESPONSE_SIZE={"api:post-list": size // 2}):
+            with self.assertRaisesMessage(ResponseTooLarge, "/api/posts"):
+                call(self.request, "/api/posts", view="api:post-list")
+            call(self.request, "/api/posts/1/post-1", view="api:post-detail")
+        with override_settings(CALLER_MAX_REQUEST_SIZE=get_stats(self.request).bytes + size // 2):
+            with self.assertRaises(ResponseTooLarge):
+                call(self.request, "/api/posts", view="api:post-list")
+
+    def test_streaming_response(self):
+        chunks = []
+
+        def app(environ, start_response):
+            start_response("200 OK", [("Content-Type", "application/json")])
+            for chunk in [b'{"data": ', b'"abc"', b'}']:
+                chunks.append(chunk)
+                yield chunk
+
+        handler = CallHandler(environ=self.request.environ.copy())
+        handler.run(app)
+        self.assertEqual(json.loads(handler.content.decode()), {"data": "abc"})
+        del chunks[:]
+        handler = CallHandler(environ=self.request.environ.copy(), max_size=10)
+        handler.run(app)
+        self.assertIsInstance(handler.exception, ResponseTooLarge)
+        self.assertEqual(len(chunks), 2)
+
+    @override_settings(CALLER_QUERIES=True)
+    def test_count_queries(self):
+        call(self.request, "/api/posts", view="api:post-list")
+        stats = get_stats(self.request)
+        self.assertEqual(stats.calls[0].queries, 1)
+        self.assertEqual(stats.queries, 1)
+
+    @override_settings(CALLER_QUERY_BUDGET={"api": 0})
+    def test_query_budget(self):
+        with self.assertLogs("caller", "WARNING"):
+            call(self.request, "/api/posts", view="api:post-list")
+        with override_settings(CALLER_QUERY_BUDGET_ACTION="raise"):
+            with self.assertRaises(QueryBudgetExceeded):
+                call(self.request, "/api/posts", view="api:post-list")
+        with override_settings(CALLER_QUERY_BUDGET={"api": 1, "api:post-list": 0}):
+            with self.assertLogs("caller", "WARNING"):
+                call(self.request, "/api/posts", view="api:post-list")
+
+    def test_request_signals_are_not_sent(self):
+        receiver = mock.Mock()
+        signals.request_started.connect(receiver)
+        signals.request_finished.connect(receiver)
+        try:
+            call(self.request, "/api/posts", view="api:post-list")
+        finally:
+            signals.request_started.disconnect(receiver)
+            signals.request_finished.disconnect(receiver)
+        self.assertFalse(receiver.called)
+
+    @override_settings(CALLER_QUERIES=True)
+    def test_stats_middleware(self):
+        def view(request):
+            call(request, "/api/posts", view="api:post-list")
+            return HttpResponse()
+
+        with self.assertLogs("caller", "INFO") as logs:
+            StatsMiddleware(view)(self.request)
+        self.assertIn("1 calls in", logs.output[0])
+        self.assertIn("/api/posts", logs.output[0])
+
+
+class TestMiddleware(TestCase):
+    def setUp(self):
+        self.posts = [Post.objects.create(**post) for post in POSTS]
+        self.request = self.client.get("/", HTTP_ACCEPT_ENCODING="gzip").wsgi_request
+        del middleware.calls[:]
+
+    @override_settings(CALLER_MIDDLEWARE=["tests.middleware.RecordMiddleware"])
+    def test_middleware(self):
+        call(self.request, "/api/posts", view="api:post-list")
+        self.assertEqual([request.path for request in middleware.calls], ["/api/posts"])
+        self.assertIs(get_app("api:post-list"), get_app("api:post-detail"))
+
+    @override_settings(
+        CALLER_MIDDLEWARE=["tests.middleware.RecordMiddleware"],
+        CALLER_MIDDLEWARE_PROFILES={"api:post-detail": []},
+    )
+    def test_profiles(self):
+        call(self.request, "/api/posts", view="api:post-list")
+        call(self.request, "/api/posts/1/post-1", view="api:post-detail")
+        self.assertEqual([request.path for request in middleware.calls], ["/api/posts"])
+        self.assertIsNot(get_app("api:post-list"), get_app("api:post-detail"))
+
+    @override_settings(CALLER_MIDDLEWARE=["django.middleware.gzip.GZipMiddleware"])
+    def test_gzip(self):
+        data = call(self.request, "/api/posts", view="api:post-list")
+        self.assertEqual(len(data["data"]), 4)
+
+    @override_settings(MIDDLEWARE=None, CALLER_SHARE_REQUEST=True)
+    def test_middleware_classes(self):
+        # django 1.11 projects with MIDDLEWARE_CLASSES: django loads their middleware
+        self.assertIsNone(get_middleware("api:post-list"))
+        with mock.patch("django.core.handlers.base.BaseHandler.load_middleware") as load_middleware:
+            get_app("api:post-list")
+        load_middleware.assert_called_once_with()
+
+
+class TestShareRequest(TestCase):
+    def setUp(self):
+        self.posts = [Post.objects.create(**post) for post in POSTS]
+        self.client.force_login(User.objects.create_user("user", password="password"))
+        self.request = self.client.get("/").wsgi_request
+        # resolve the user in the original request
+        self.assertEqual(self.request.user.username, "user")
+        del middleware.calls[:]
+
+    def test_not_shared(self):
+        with override_settings(CALLER_MIDDLEWARE=settings.MIDDLEWARE + ["tests.middleware.RecordMiddleware"]):
+            with CaptureQueriesContext(connection) as queries:
+                call(self.request, "/api/posts", view="api:post-list")
+                self.assertEqual(middleware.calls[0].user.username, "user")
+        # session + user + posts
+        self.assertEqual(len(queries), 3)
+
+    @override_settings(CALLER_SHARE_REQUEST=True)
+    def test_shared(self):
+        with override_settings(CALLER_MIDDLEWARE=settings.MIDDLEWARE + ["tests.middleware.RecordMiddleware"]):
+            with CaptureQueriesContext(connection) as queries:
+                call(self.request, "/api/posts", view="api:post-list")
+                self.assertEqual(middleware.calls[0].user.username, "user")
+        # posts
+        self.assertEqual(len(queries), 1)
+        self.assertIs(middleware.calls[0].user, self.request.user)
+        self.assertIs(middleware.calls[0].session, self.request.session)
+
+    @override_settings(CALLER_SHARE_REQUEST=True)
+    def test_shared_missing(self):
+        # a request without session and user: the calls load them
+        request = RequestFactory().get("/")
+        with override_settings(CALLER_MIDDLEWARE=settings.MIDDLEWARE + ["tests.middleware.RecordMiddleware"]):
+            call(request, "/api/posts", view="api:post-list")
+            self.assertTrue(middleware.calls[0].user.is_anonymous)
+        self.assertIn("django.contrib.auth.middleware.AuthenticationMiddleware", get_middleware(None))
+        self.assertNotIn("django.contrib.auth.middleware.AuthenticationMiddleware", get_middleware(None, shared=True))
+
+
+class TestSingleFlight(SimpleTestCase):
+    def setUp(self):
+        self.request = RequestFactory().get("/")
+        self.release = threading.Event()
+
+    def fetch(self, *args, **kwargs):
+        # wait for the other threads to join the flight
+        self.release.wait(5)
+        return b'{"data": [1, 2]}', 200, None
+
+    def call_many(self, count, **kwargs):
+        with ThreadPoolExecutor(count) as pool:
+            futures = [pool.submit(call, self.request, "/api/posts", view="api:post-list", **kwargs) for i in range(count)]  # noqa: E501
+            while len(flights._flights) != 1 or next(iter(flights._flights.values())).waiters != count - 1:
+                time.sleep(0.001)
+            self.release.set()
+            return [future.result() for future in futures]
+
+    @override_settings(CALLER_SINGLE_FLIGHT=True)
+    def test_shared(self):
+        with mock.patch("caller.utils.fetch", side_effect=self.fetch) as fetch:
+            results = self.call_many(8)
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(results, [{"data": [1, 2]}] * 8)
+        # every call gets its own copy
+        self.assertEqual(len({id(result["data"]) for result in results}), 8)
+
+    def test_key(self):
+        secure = RequestFactory().get("/", secure=True)
+        self.assertEqual(get_flight_key(self.request, "/api/posts", "", "api:post-list"), get_flight_key(RequestFactory().get("/"), "/api/posts", "", "api:post-list"))  # noqa: E501
+        # payloads have absolute urls
+        self.assertNotEqual(get_flight_key(self.request, "/api/posts", "", "api:post-list"), get_flight_key(secure, "/api/posts", "", "api:post-list"))  # noqa: E501
+
+    @override_settings(CALLER_SINGLE_FLIGHT={"api:post-detail": True})
+    def test_not_shared(self):
+        self.release.set()
+        with mock.patch("caller.utils.fetch", side_effect=self.fetch) as fetch:
+            call(self.request, "/api/posts", view="api:post-list")
+            call(self.request, "/api/posts", view="api:post-list")
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_exception(self):
+        release = threading.Event()
+
+        def fail():
+            release.wait(5)
+            raise ZeroDivisionError
+
+        with ThreadPoolExecutor(2) as pool:
+            futures = [pool.submit(flights.do, "key", fail) for i in range(2)]
+            while not flights._flights or flights._flights["key"].waiters != 1:
+                time.sleep(0.001)
+            release.set()
+            for future in futures:
+                with self.assertRaises(ZeroDivisionError):
+                    future.result()
+        self.assertEqual(flights._flights, {})
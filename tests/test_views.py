@@ -0,0 +1,82 @@
+# Copyright (C) 2018, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import json
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from example.models import Post
+
+from .test_tags import POSTS
+
+
+@override_settings(CALLER_MAX_WORKERS=0)
+class TestBatchView(TestCase):
+    def setUp(self):
+        self.posts = [Post.objects.create(**post) for post in POSTS]
+
+    def batch(self, calls):
+        return self.client.post("/api/batch", data=json.dumps(calls), content_type="application/json")
+
+    def test_batch(self):
+        response = self.batch([
+            {"view": "api:post-list"},
+            {"view": "api:post-detail", "args": [1, "post-1"], "params": {"full": 1}},
+            {"path": "/api/posts/2/post-2"},
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual([result["status"] for result in results], [200, 200, 200])
+        self.assertEqual(len(results[0]["data"]["data"]), 4)
+        self.assertEqual(results[1]["data"]["url"], "http://testserver/api/posts/1/post-1?full=1")
+        self.assertEqual(results[2]["data"]["data"]["slug"], "post-2")
+
+    def test_status(self):
+        response = self.batch([
+            {"view": "api:post-detail", "args": [99, "nope"]},
+            {"view": "api:post-detail", "args": [1, "post-1"]},
+        ])
+        results = response.json()["results"]
+        self.assertEqual([result["status"] for result in results], [404, 200])
+        self.assertEqual(results[0]["data"]["status"], 404)
+
+    def test_failed_call(self):
+        with mock.patch("caller.client.call", side_effect=ValueError):
+            response = self.batch([{"view": "api:post-list"}])
+        self.assertEqual(response.json()["results"], [{"status": 500, "error": "api:post-list failed"}])
+
+    def test_not_allowed(self):
+        response = self.batch([
+            {"view": "blog:post-list"},
+            {"path": "/posts/"},
+            {"view": "api:batch"},
+            {"view": "api:post-detail"},
+            {"path": "/api/missing"},
+            {"args": [1]},
+        ])
+        results = response.json()["results"]
+        self.assertEqual([result["status"] for result in results], [403, 403, 403, 404, 404, 400])
+
+    def test_limits(self):
+        self.assertEqual(self.batch({"view": "api:post-list"}).status_code, 400)
+        self.assertEqual(self.client.post("/api/batch", data="[", content_type="application/json").status_code, 400)
+        with override_settings(CALLER_BATCH_MAX_CALLS=2):
+            self.assertEqual(self.batch([{"view": "api:post-list"}] * 3).status_code, 400)
+            self.assertEqual(self.batch([{"view": "api:post-list"}] * 2).status_code, 200)
@@ -37,6 +37,7 @@ from django.utils.safestring import mark_safe
 
 ROOT = os.path.dirname(os.path.abspath(__file__))
 TEMPLATE_DIR = os.path.join(ROOT, 'templates')
+SNAPSHOT_DIR = os.path.join(ROOT, 'snapshots')
 
 
 def setup(templates, *args, **kwargs):
@@ -106,3 +107,25 @@ def setup(templates, *args, **kwargs):
         return inner
 
     return decorator
+
+
+class snapshot(override_settings):
+    """
+    Replay the calls of a test from the snapshots/<name>.jsonl file, without its
+    database fixtures. Run the tests with CALLER_SNAPSHOT_MODE=record in the
+    environment to record them again: fixtures (a function) then creates the
+    database objects the calls need.
+
+    Use it as a decorator (outside @setup) or as a context manager.
+    """
+    def __init__(self, name, mode=None, fixtures=None):
+        self.fixtures = fixtures
+        super().__init__(
+            CALLER_SNAPSHOT_MODE=mode or os.environ.get('CALLER_SNAPSHOT_MODE', 'replay'),
+            CALLER_SNAPSHOT_PATH=os.path.join(SNAPSHOT_DIR, '{}.jsonl'.format(name)),
+        )
+
+    def enable(self):
+        super().enable()
+        if self.fixtures is not None and self.options['CALLER_SNAPSHOT_MODE'] == 'record':
+            self.fixtures()